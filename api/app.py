@@ -7,6 +7,7 @@ import dotenv
 
 import re
 import datetime
+from cache import SerpCache
 
 dotenv.load_dotenv()
 
@@ -16,16 +17,29 @@ CSE_ID = os.getenv("CSE_ID")
 CSE_API_KEY = os.getenv("CSE_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+serp_cache = SerpCache(namespace="cse")
+
 
 @app.get("/search")
 def query_search(query):
+    cached = serp_cache.get(query)
+    if cached is not None:
+        return cached
+
     base_url = "https://www.googleapis.com/customsearch/v1"
     params = {"q": query, "key": CSE_API_KEY, "cx": CSE_ID}
     response = requests.get(base_url, params=params)
     result = response.json()
+    if response.ok:
+        serp_cache.put(query, result)
     return result
 
 
+@app.get("/search/stats")
+def search_cache_stats():
+    return serp_cache.stats()
+
+
 @app.get("/extract") 
 def scrape_webpage(url):
     # Extract date from URL to keep it after scraping
@@ -0,0 +1,89 @@
+"""Benchmark HTML extraction throughput per parser backend and worker count.
+
+Usage:
+    python benchmark_parsing.py                  # synthetic ~2 MB filing-style pages
+    python benchmark_parsing.py --pages-dir DIR  # real pages saved as *.html
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from pathlib import Path
+from typing import List
+
+from html_parsing import PARSER_BACKENDS, HTMLParserPool, extract_content, resolve_parser
+
+
+def synthetic_page(target_bytes: int, seed: int) -> str:
+    """Build a filing-like page with navigation, scripts, tables and long paragraphs"""
+    rng = random.Random(seed)
+    words = ['revenue', 'quarter', 'fiscal', 'increase', 'operating', 'margin', 'net', 'income',
+             'growth', 'segment', 'services', 'products', 'billion', 'percent', 'compared', 'year']
+    parts = ['<html><head><title>Annual Report</title><script>var x = 1;</script></head><body>',
+             '<nav><a href="/">Home</a><a href="/ir">Investors</a></nav><main>']
+    size = sum(len(p) for p in parts)
+    while size < target_bytes:
+        if rng.random() < 0.2:
+            cells = ''.join(f'<td>{rng.randint(1, 99999)}</td>' for _ in range(8))
+            chunk = f'<table><tr>{cells}</tr><tr>{cells}</tr></table>'
+        else:
+            chunk = f"<p>{' '.join(rng.choice(words) for _ in range(60))}.</p>"
+        parts.append(chunk)
+        size += len(chunk)
+    parts.append('</main><footer>Privacy policy</footer></body></html>')
+    return ''.join(parts)
+
+
+def load_pages(args) -> List[str]:
+    if args.pages_dir:
+        return [p.read_text(errors='ignore') for p in sorted(Path(args.pages_dir).glob('*.html'))]
+    return [synthetic_page(args.page_kb * 1024, seed) for seed in range(args.pages)]
+
+
+def bench_inline(pages: List[str], parser: str) -> float:
+    start = time.perf_counter()
+    for i, page in enumerate(pages):
+        extract_content(page, f'https://example.com/{i}', parser)
+    return len(pages) / (time.perf_counter() - start)
+
+
+async def bench_pool(pages: List[str], parser: str, workers: int) -> float:
+    pool = HTMLParserPool(max_workers=workers, parser=parser)
+    try:
+        # Warm the worker processes so spawn cost is not measured
+        await asyncio.gather(*(pool.extract_content(pages[0], 'warmup') for _ in range(workers)))
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            pool.extract_content(page, f'https://example.com/{i}') for i, page in enumerate(pages)
+        ))
+        return len(pages) / (time.perf_counter() - start)
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', type=int, default=24, help='number of synthetic pages')
+    parser.add_argument('--page-kb', type=int, default=2048, help='synthetic page size in KB')
+    parser.add_argument('--pages-dir', help='directory of saved .html pages to parse instead')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    total_mb = sum(len(p) for p in pages) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.1f} MB total, {args.workers} pool workers\n")
+    print(f"{'backend':<12} {'mode':<10} {'pages/s':>9} {'pages/s/core':>13}")
+
+    for backend in PARSER_BACKENDS:
+        if resolve_parser(backend) != backend:
+            print(f"{backend:<12} not installed")
+            continue
+        rate = bench_inline(pages, backend)
+        print(f"{backend:<12} {'inline':<10} {rate:>9.2f} {rate:>13.2f}")
+        rate = asyncio.run(bench_pool(pages, backend, args.workers))
+        print(f"{backend:<12} {'pool':<10} {rate:>9.2f} {rate / args.workers:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
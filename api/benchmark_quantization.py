@@ -0,0 +1,114 @@
+"""Benchmark recall and memory of quantized local vector index configurations.
+
+Quantized codes are stored next to the float32 matrix used for re-ranking, so
+"index" is the total stored per vector (matrix plus codes) and grows with
+quantization, while "scanned" is what the coarse pass of each query reads.
+
+Usage:
+    python benchmark_quantization.py                       # synthetic clustered 1536-d vectors
+    python benchmark_quantization.py --embeddings FILE.npy # real embeddings, one per row
+"""
+import argparse
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from vector_backends import LocalVectorIndex
+
+# (label, quantization, coarse dimension fraction, re-rank factor or None for the --rerank-factor default)
+CONFIGURATIONS: List[Tuple[str, Optional[str], float, Optional[int]]] = [
+    ('float32', None, 1.0, None),
+    ('int8', 'int8', 1.0, None),
+    ('int8 1/2 dims', 'int8', 0.5, None),
+    ('binary', 'binary', 1.0, None),
+    ('binary x4', 'binary', 1.0, 4),
+    ('binary x20', 'binary', 1.0, 20),
+    ('binary 1/2 x20', 'binary', 0.5, 20),
+]
+
+
+def synthetic_embeddings(count: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered vectors sharing a common offset, roughly like text embeddings"""
+    rng = np.random.default_rng(seed)
+    offset = rng.standard_normal(dimension) * 0.5
+    centers = rng.standard_normal((clusters, dimension))
+    assignment = rng.integers(0, clusters, count)
+    vectors = offset + centers[assignment] + rng.standard_normal((count, dimension)) * 0.8
+    return vectors.astype(np.float32)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.choice(len(vectors), count, replace=False)]
+    scale = np.linalg.norm(picks, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return picks + rng.standard_normal(picks.shape).astype(np.float32) * noise * scale
+
+
+def build_index(vectors: np.ndarray, quantization: Optional[str], coarse_dimensions: int, rerank_factor: int):
+    index = LocalVectorIndex(
+        tempfile.mkdtemp(),
+        dimension=vectors.shape[1],
+        quantization=quantization,
+        coarse_dimensions=coarse_dimensions,
+        rerank_factor=rerank_factor
+    )
+    for start in range(0, len(vectors), 1000):
+        index.upsert([
+            {'id': str(i), 'values': vectors[i], 'metadata': {'organization': 'benchmark'}}
+            for i in range(start, min(start + 1000, len(vectors)))
+        ])
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--embeddings', help='.npy file of embeddings to index instead of synthetic ones')
+    parser.add_argument('--vectors', type=int, default=20_000, help='number of synthetic vectors')
+    parser.add_argument('--dimension', type=int, default=1536)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.5, help='query perturbation relative to vector scale')
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--rerank-factor', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype(np.float32)
+    else:
+        vectors = synthetic_embeddings(args.vectors, args.dimension, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    count, dimension = vectors.shape
+    float_bytes = dimension * 4
+    print(f"{count} vectors x {dimension} dims, {len(queries)} queries, "
+          f"top {args.top_k}, re-rank factor {args.rerank_factor}\n")
+    print(f"{'configuration':<17} {'index B/vec':>12} {'scanned B/vec':>14} {'scan cut':>9} "
+          f"{'recall@k':>9} {'ms/query':>9}")
+
+    truth = None
+    for label, quantization, fraction, rerank_factor in CONFIGURATIONS:
+        coarse_dimensions = max(8, int(dimension * fraction))
+        index = build_index(vectors, quantization, coarse_dimensions, rerank_factor or args.rerank_factor)
+
+        start = time.perf_counter()
+        results = [
+            [match.id for match in index.query(query, top_k=args.top_k).matches]
+            for query in queries
+        ]
+        per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        if truth is None:
+            truth = results
+        recall = np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)])
+        # The float matrix is always stored; a quantized query scans only the codes
+        code_bytes = index.codes.nbytes(1) if index.codes is not None else 0
+        stored = float_bytes + code_bytes
+        scanned = code_bytes or float_bytes
+        print(f"{label:<17} {stored:>12} {scanned:>14} {float_bytes / scanned:>8.1f}x "
+              f"{recall:>9.3f} {per_query_ms:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
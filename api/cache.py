@@ -0,0 +1,791 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Union
+from urllib.parse import unquote_plus
+
+import numpy as np
+
+from config import Config
+from dedup import canonicalize_url
+from schemas import ContentType
+
+
+def _atomic_write(path: Path, data: bytes):
+    """Write a file so readers never observe a partially written entry"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+@dataclass
+class CachedPage:
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+    ttl: float
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() - self.fetched_at < self.ttl
+
+    def revalidation_headers(self) -> Dict[str, str]:
+        """Conditional request headers for revalidating a stale entry"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """Persistent on-disk cache of fetched pages.
+
+    Bodies are zlib-compressed and stored under the SHA-256 of their content, so
+    identical pages served from different URLs share storage. A small JSON entry
+    per canonical URL records the body hash, the ETag/Last-Modified validators and when the
+    page was fetched. Freshness is decided by a TTL per content type.
+    """
+
+    DEFAULT_TTLS = {
+        ContentType.REGULATORY_FILING: 7 * 24 * 3600,
+        ContentType.FINANCIAL_REPORT: 24 * 3600,
+        ContentType.PRESS_RELEASE: 3 * 24 * 3600,
+        ContentType.COMPANY_WEBSITE: 24 * 3600,
+        ContentType.NEWS_ARTICLE: 6 * 3600,
+        ContentType.OTHER: 6 * 3600,
+    }
+
+    def __init__(
+        self,
+        cache_dir: Optional[Union[str, Path]] = None,
+        ttls: Optional[Dict[ContentType, float]] = None,
+        compression_level: int = 6
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = Path(cache_dir) if cache_dir else Config.get_cache_dir() / 'pages'
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self.compression_level = compression_level
+
+    @staticmethod
+    def _hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _entry_path(self, url: str) -> Path:
+        key = self._hash(canonicalize_url(url).encode('utf-8'))
+        return self.cache_dir / 'entries' / key[:2] / f"{key}.json"
+
+    def _body_path(self, body_hash: str) -> Path:
+        return self.cache_dir / 'bodies' / body_hash[:2] / f"{body_hash}.z"
+
+    def ttl_for(self, content_type: Union[ContentType, str]) -> float:
+        try:
+            return self.ttls.get(ContentType(content_type), self.ttls[ContentType.OTHER])
+        except ValueError:
+            return self.ttls[ContentType.OTHER]
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Return the cached page for `url`, fresh or stale, if present"""
+        try:
+            entry = json.loads(self._entry_path(url).read_text())
+            compressed = self._body_path(entry['body_hash']).read_bytes()
+            body = zlib.decompress(compressed).decode('utf-8')
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"Discarding unreadable cache entry for {url}: {str(e)}")
+            return None
+
+        return CachedPage(
+            url=url,
+            body=body,
+            etag=entry.get('etag'),
+            last_modified=entry.get('last_modified'),
+            fetched_at=entry['fetched_at'],
+            ttl=self.ttl_for(entry.get('content_type', ContentType.OTHER))
+        )
+
+    def put(
+        self,
+        url: str,
+        body: str,
+        headers: Mapping[str, str],
+        content_type: Union[ContentType, str] = ContentType.OTHER
+    ):
+        """Store a freshly downloaded page with its validators"""
+        raw = body.encode('utf-8')
+        body_hash = self._hash(raw)
+        body_path = self._body_path(body_hash)
+        try:
+            if not body_path.exists():
+                _atomic_write(body_path, zlib.compress(raw, self.compression_level))
+            entry = {
+                'url': url,
+                'body_hash': body_hash,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'content_type': ContentType(content_type).value,
+                'fetched_at': time.time(),
+            }
+            _atomic_write(self._entry_path(url), json.dumps(entry).encode('utf-8'))
+        except Exception as e:
+            self.logger.warning(f"Failed to cache {url}: {str(e)}")
+
+    def touch(self, url: str, headers: Mapping[str, str]):
+        """Mark a stale entry fresh again after a 304 Not Modified"""
+        entry_path = self._entry_path(url)
+        try:
+            entry = json.loads(entry_path.read_text())
+            entry['fetched_at'] = time.time()
+            entry['etag'] = headers.get('ETag', entry.get('etag'))
+            entry['last_modified'] = headers.get('Last-Modified', entry.get('last_modified'))
+            _atomic_write(entry_path, json.dumps(entry).encode('utf-8'))
+        except Exception as e:
+            self.logger.warning(f"Failed to refresh cache entry for {url}: {str(e)}")
+
+
+QUERY_STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'been', 'by', 'did', 'do', 'does',
+    'for', 'from', 'has', 'have', 'how', 'in', 'is', 'it', 'its', 'of', 'on', 'or',
+    'that', 'the', 'their', 'this', 'to', 'was', 'were', 'what', 'when', 'which',
+    'who', 'why', 'will', 'with'
+}
+
+
+def normalize_query(query: str) -> str:
+    """Reduce a search query to a canonical cache key.
+
+    The query is URL-decoded and lowercased, fiscal-year spellings such as
+    "FY2023" or "FY23" become plain years, and punctuation, stopwords and extra
+    whitespace are dropped. Term order is kept, so "What is the revenue growth?"
+    and "What was the revenue growth?" map to the same key while "Apple beats
+    Microsoft" and "Microsoft beats Apple" do not.
+    """
+    text = unquote_plus(query).lower()
+    text = re.sub(r"\bfy\s*'?(\d{2})\b", r'20\1', text)
+    text = re.sub(r'\bfy\s*((?:19|20)\d{2})\b', r'\1', text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    return ' '.join(token for token in text.split() if token not in QUERY_STOPWORDS)
+
+
+class SerpCache:
+    """Cache of search engine results keyed by the normalized query.
+
+    Entries live in an in-memory dict backed by JSON files on disk, both expiring
+    after `ttl` seconds. Hit and miss counts are kept for monitoring.
+    """
+
+    def __init__(
+        self,
+        namespace: str = 'google',
+        ttl: float = 12 * 3600,
+        cache_dir: Optional[Union[str, Path]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.ttl = ttl
+        self.cache_dir = (Path(cache_dir) if cache_dir else Config.get_cache_dir() / 'serp') / namespace
+        self.memory: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, query: str) -> Optional[Any]:
+        """Return cached results for `query`, or None on a miss"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self.memory.get(key)
+        if entry is None:
+            try:
+                entry = json.loads(self._path(key).read_text())
+            except FileNotFoundError:
+                entry = None
+            except Exception as e:
+                self.logger.warning(f"Discarding unreadable SERP cache entry: {str(e)}")
+                entry = None
+
+        with self._lock:
+            if entry is None or time.time() - entry['stored_at'] >= self.ttl:
+                self.memory.pop(key, None)
+                self.misses += 1
+                return None
+            self.memory[key] = entry
+            self.hits += 1
+            return entry['results']
+
+    def put(self, query: str, results: Any):
+        """Store results for `query`"""
+        key = normalize_query(query)
+        entry = {'query': key, 'results': results, 'stored_at': time.time()}
+        with self._lock:
+            self.memory[key] = entry
+        try:
+            _atomic_write(self._path(key), json.dumps(entry).encode('utf-8'))
+        except Exception as e:
+            self.logger.warning(f"Failed to persist SERP cache entry: {str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'entries_in_memory': len(self.memory)
+            }
+
+
+def normalize_embedding_text(text: str) -> str:
+    """Canonical form of an embedding input: NFC unicode with collapsed whitespace"""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+class EmbeddingCache:
+    """Two-tier cache of embeddings keyed by model and normalized input text.
+
+    A bounded in-memory LRU sits in front of a SQLite table of float32 vectors.
+    Both tiers evict least recently used entries once they exceed their limits.
+    Hits are counted per tier for monitoring.
+    """
+
+    def __init__(
+        self,
+        max_memory_entries: int = 10_000,
+        max_disk_entries: int = 200_000,
+        cache_dir: Optional[Union[str, Path]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.path = (Path(cache_dir) if cache_dir else Config.get_cache_dir()) / 'embeddings.sqlite3'
+        self.memory: 'OrderedDict[str, List[float]]' = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_embedding_text(text)}".encode('utf-8')).hexdigest()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS embeddings ('
+                    'key TEXT PRIMARY KEY, model TEXT, vector BLOB, last_used REAL)'
+                )
+                self._db.execute('CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)')
+                self._db.commit()
+            except Exception as e:
+                self.logger.warning(f"Embedding cache disk tier unavailable: {str(e)}")
+                self._db = None
+        return self._db
+
+    def _remember(self, key: str, vector: List[float]):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached embeddings for `texts` in order, with None for misses"""
+        keys = [self.key(model, text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+                    self.memory_hits += 1
+
+            missing = list(dict.fromkeys(k for k in keys if k not in found))
+            db = self._connection() if missing else None
+            if db is not None:
+                try:
+                    for start in range(0, len(missing), 500):
+                        chunk = missing[start:start + 500]
+                        rows = db.execute(
+                            f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                            chunk
+                        ).fetchall()
+                        for key, blob in rows:
+                            vector = array('f')
+                            vector.frombytes(blob)
+                            found[key] = vector.tolist()
+                            self._remember(key, found[key])
+                            self.disk_hits += 1
+                    disk_keys = [k for k in missing if k in found]
+                    if disk_keys:
+                        now = time.time()
+                        db.executemany('UPDATE embeddings SET last_used = ? WHERE key = ?', [(now, k) for k in disk_keys])
+                        db.commit()
+                except Exception as e:
+                    self.logger.warning(f"Embedding cache lookup failed: {str(e)}")
+
+            results = [found.get(key) for key in keys]
+            self.misses += sum(1 for r in results if r is None)
+            return results
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store embeddings for `texts` in both tiers"""
+        rows = []
+        now = time.time()
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.key(model, text)
+                self._remember(key, list(vector))
+                rows.append((key, model, array('f', vector).tobytes(), now))
+
+            db = self._connection()
+            if db is None or not rows:
+                return
+            try:
+                db.executemany('INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)', rows)
+                self._evict(db)
+                db.commit()
+            except Exception as e:
+                self.logger.warning(f"Failed to persist embeddings: {str(e)}")
+
+    def _evict(self, db: sqlite3.Connection):
+        """Drop the least recently used rows beyond `max_disk_entries`"""
+        (count,) = db.execute('SELECT COUNT(*) FROM embeddings').fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            db.execute(
+                'DELETE FROM embeddings WHERE key IN '
+                '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                (excess,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total else 0.0,
+                'entries_in_memory': len(self.memory)
+            }
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide embedding cache, created on first use"""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+class ResponseCache:
+    """Two-tier cache of LLM responses keyed by everything that shaped the prompt.
+
+    The key covers the model, the prompt template version, the normalized
+    question, the organization and the fingerprints of the sources in prompt
+    order, so any change to the retrieved content is a miss. A bounded
+    in-memory LRU sits in front of a SQLite table; entries expire after `ttl`
+    seconds in both tiers and the least recently used are evicted beyond
+    each tier's limit.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 24 * 3600,
+        max_memory_entries: int = 2_000,
+        max_disk_entries: int = 50_000,
+        cache_dir: Optional[Union[str, Path]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.path = (Path(cache_dir) if cache_dir else Config.get_cache_dir()) / 'responses.sqlite3'
+        self.memory: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()  # key -> {'response', 'stored_at'}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = None
+
+    @staticmethod
+    def key(model: str, prompt_version: str, question: str, organization: str, source_hashes: List[str]) -> str:
+        payload = json.dumps(
+            [model, prompt_version, normalize_embedding_text(question).casefold(), organization.strip().casefold(), source_hashes],
+            separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS responses ('
+                    'key TEXT PRIMARY KEY, model TEXT, response BLOB, stored_at REAL, last_used REAL)'
+                )
+                self._db.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+                self._db.commit()
+            except Exception as e:
+                self.logger.warning(f"Response cache disk tier unavailable: {str(e)}")
+                self._db = None
+        return self._db
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The cached response for `key`, or None when missing or expired"""
+        now = time.time()
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if now - entry['stored_at'] < self.ttl:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return json.loads(json.dumps(entry['response']))
+                del self.memory[key]
+
+            db = self._connection()
+            if db is not None:
+                try:
+                    row = db.execute(
+                        'SELECT response, stored_at FROM responses WHERE key = ? AND stored_at > ?',
+                        (key, now - self.ttl)
+                    ).fetchone()
+                    if row is not None:
+                        response = json.loads(zlib.decompress(row[0]).decode('utf-8'))
+                        db.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+                        db.commit()
+                        self._remember(key, {'response': response, 'stored_at': row[1]})
+                        self.disk_hits += 1
+                        return json.loads(json.dumps(response))
+                except Exception as e:
+                    self.logger.warning(f"Response cache lookup failed: {str(e)}")
+            self.misses += 1
+            return None
+
+    def put(self, key: str, model: str, response: Dict):
+        """Store a response in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, {'response': response, 'stored_at': now})
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                    (key, model, zlib.compress(json.dumps(response).encode('utf-8')), now, now)
+                )
+                self._evict(db, now)
+                db.commit()
+            except Exception as e:
+                self.logger.warning(f"Failed to persist LLM response: {str(e)}")
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        """Drop expired rows, then the least recently used beyond `max_disk_entries`"""
+        db.execute('DELETE FROM responses WHERE stored_at <= ?', (now - self.ttl,))
+        (count,) = db.execute('SELECT COUNT(*) FROM responses').fetchone()
+        excess = count - self.max_disk_entries
+        if excess > 0:
+            db.execute(
+                'DELETE FROM responses WHERE key IN '
+                '(SELECT key FROM responses ORDER BY last_used LIMIT ?)',
+                (excess,)
+            )
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total else 0.0,
+                'entries_in_memory': len(self.memory)
+            }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide LLM response cache, created on first use"""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
+
+
+# Years, fiscal years and quarters a question is pinned to
+PERIOD_PATTERN = re.compile(r"\b(?:fy\s*'?)?((?:19|20)\d{2})\b|\bfy\s*'?(\d{2})\b|\b(q[1-4]|h[12])\b", re.IGNORECASE)
+
+
+def question_periods(question: str) -> frozenset:
+    """Periods named in a question, so 'revenue in 2023' never answers 'revenue in 2024'"""
+    periods = set()
+    for year, short_year, part in PERIOD_PATTERN.findall(question):
+        if year or short_year:
+            periods.add(year or f"20{short_year}")
+        else:
+            periods.add(part.lower())
+    return frozenset(periods)
+
+
+@dataclass
+class AnswerMatch:
+    answer_id: int
+    question: str
+    similarity: float
+    row: Dict[str, Any]
+    answered_at: float
+
+
+class SemanticAnswerCache:
+    """Per-organization cache of answered questions, matched by question embedding.
+
+    A new question reuses a stored answer row for the same organization when
+    the cosine similarity of their embeddings is at least `threshold`, the
+    answer is younger than `max_age` seconds and both questions name the same
+    periods (years, quarters). Rows live in SQLite; each organization's
+    question embeddings are loaded into one normalized matrix on first use,
+    so a lookup is a single matrix-vector product.
+
+    Answers a user flags with `report_false_hit` count as false hits and are
+    never matched to that question again. A threshold above 1 turns matching off.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.93,
+        max_age: float = 24 * 3600,
+        max_entries_per_organization: int = 1_000,
+        cache_dir: Optional[Union[str, Path]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.threshold = threshold
+        self.max_age = max_age
+        self.max_entries_per_organization = max_entries_per_organization
+        self.path = (Path(cache_dir) if cache_dir else Config.get_cache_dir()) / 'answers.sqlite3'
+        # (embedding signature, organization) -> loaded entries
+        self.organizations: Dict[tuple, Dict[str, Any]] = {}
+        self.recent_hits: 'OrderedDict[tuple, int]' = OrderedDict()  # (organization, question) -> answer id
+        self.lookups = 0
+        self.hits = 0
+        self.stale = 0
+        self.period_mismatches = 0
+        self.false_hits = 0
+        self.hit_similarity = 0.0
+        self._lock = threading.Lock()
+        self._db = None
+
+    @staticmethod
+    def _organization_key(organization: str) -> str:
+        return organization.strip().casefold()
+
+    @staticmethod
+    def _question_key(question: str) -> str:
+        return normalize_embedding_text(question).casefold()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS answers ('
+                    'id INTEGER PRIMARY KEY, signature TEXT, organization TEXT, question TEXT, '
+                    'embedding BLOB, row TEXT, answered_at REAL)'
+                )
+                self._db.execute('CREATE INDEX IF NOT EXISTS answers_organization ON answers (signature, organization)')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS false_hits ('
+                    'answer_id INTEGER, question TEXT, PRIMARY KEY (answer_id, question))'
+                )
+                self._db.commit()
+            except Exception as e:
+                self.logger.warning(f"Answer cache unavailable: {str(e)}")
+                self._db = None
+        return self._db
+
+    def _entries(self, db: sqlite3.Connection, signature: str, organization: str) -> Dict[str, Any]:
+        """The organization's answers as arrays aligned with a normalized embedding matrix"""
+        key = (signature, organization)
+        entries = self.organizations.get(key)
+        if entries is None:
+            rows = db.execute(
+                'SELECT id, question, embedding, answered_at FROM answers '
+                'WHERE signature = ? AND organization = ? ORDER BY id',
+                (signature, organization)
+            ).fetchall()
+            blocked = db.execute(
+                'SELECT f.answer_id, f.question FROM false_hits f JOIN answers a ON a.id = f.answer_id '
+                'WHERE a.signature = ? AND a.organization = ?',
+                (signature, organization)
+            ).fetchall()
+            vectors = [np.frombuffer(blob, dtype=np.float32) for _, _, blob, _ in rows]
+            entries = {
+                'ids': [row[0] for row in rows],
+                'questions': [row[1] for row in rows],
+                'periods': [question_periods(row[1]) for row in rows],
+                'answered_at': np.array([row[3] for row in rows], dtype=np.float64),
+                'matrix': np.vstack(vectors) if vectors else None,
+                'blocked': set(blocked),
+            }
+            self.organizations[key] = entries
+        return entries
+
+    def lookup(self, organization: str, question: str, embedding: List[float], signature: str) -> Optional[AnswerMatch]:
+        """Best stored answer for a paraphrase of `question`, or None"""
+        organization = self._organization_key(organization)
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        with self._lock:
+            self.lookups += 1
+            db = self._connection()
+            if db is None:
+                return None
+            entries = self._entries(db, signature, organization)
+            if entries['matrix'] is None or entries['matrix'].shape[1] != query.shape[0]:
+                return None
+
+            similarities = entries['matrix'] @ query
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            if len(candidates) == 0:
+                return None
+            periods = question_periods(question)
+            question_key = self._question_key(question)
+            now = time.time()
+            for i in candidates[np.argsort(-similarities[candidates])]:
+                answer_id = entries['ids'][i]
+                if (answer_id, question_key) in entries['blocked']:
+                    continue
+                if entries['periods'][i] != periods:
+                    self.period_mismatches += 1
+                    continue
+                if now - entries['answered_at'][i] > self.max_age:
+                    self.stale += 1
+                    continue
+                found = db.execute('SELECT row FROM answers WHERE id = ?', (answer_id,)).fetchone()
+                if found is None:
+                    continue
+                self.hits += 1
+                self.hit_similarity += float(similarities[i])
+                self.recent_hits[(organization, question_key)] = answer_id
+                self.recent_hits.move_to_end((organization, question_key))
+                while len(self.recent_hits) > 10_000:
+                    self.recent_hits.popitem(last=False)
+                return AnswerMatch(
+                    answer_id=answer_id,
+                    question=entries['questions'][i],
+                    similarity=float(similarities[i]),
+                    row=json.loads(found[0]),
+                    answered_at=float(entries['answered_at'][i])
+                )
+            return None
+
+    def store(self, organization: str, question: str, embedding: List[float], signature: str, row: Dict[str, Any]):
+        """Remember an answer row, replacing any earlier answer to the same question"""
+        organization = self._organization_key(organization)
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            try:
+                db.execute(
+                    'DELETE FROM answers WHERE signature = ? AND organization = ? AND question = ?',
+                    (signature, organization, question)
+                )
+                db.execute(
+                    'INSERT INTO answers (signature, organization, question, embedding, row, answered_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (signature, organization, question, vector.tobytes(), json.dumps(row, default=str), time.time())
+                )
+                # Keep the newest answers per organization
+                db.execute(
+                    'DELETE FROM answers WHERE signature = ? AND organization = ? AND id NOT IN '
+                    '(SELECT id FROM answers WHERE signature = ? AND organization = ? ORDER BY id DESC LIMIT ?)',
+                    (signature, organization, signature, organization, self.max_entries_per_organization)
+                )
+                db.execute('DELETE FROM false_hits WHERE answer_id NOT IN (SELECT id FROM answers)')
+                db.commit()
+            except Exception as e:
+                self.logger.warning(f"Failed to store answer: {str(e)}")
+            # Reloaded from disk on the next lookup
+            self.organizations.pop((signature, organization), None)
+
+    def report_false_hit(self, organization: str, question: str) -> bool:
+        """Flag the cached answer last returned for `question` as wrong for it"""
+        organization = self._organization_key(organization)
+        question_key = self._question_key(question)
+        with self._lock:
+            answer_id = self.recent_hits.pop((organization, question_key), None)
+            db = self._connection()
+            if answer_id is None or db is None:
+                return False
+            self.false_hits += 1
+            db.execute('INSERT OR IGNORE INTO false_hits VALUES (?, ?)', (answer_id, question_key))
+            db.commit()
+            for entries in self.organizations.values():
+                if answer_id in entries['ids']:
+                    entries['blocked'].add((answer_id, question_key))
+            return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'threshold': self.threshold,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'misses': self.lookups - self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+                'mean_hit_similarity': self.hit_similarity / self.hits if self.hits else 0.0,
+                'rejected_stale': self.stale,
+                'rejected_period': self.period_mismatches,
+                'false_hits': self.false_hits,
+                'false_hit_rate': self.false_hits / self.hits if self.hits else 0.0
+            }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Process-wide semantic answer cache, created on first use"""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache(**Config.get_answer_cache_settings())
+    return _answer_cache
@@ -0,0 +1,106 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from tokenizer import count_tokens
+
+# Sentence ends followed by whitespace and something that starts a new sentence
+SENTENCE_BOUNDARY = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=["\'(\[]?[A-Z0-9$€£])')
+
+# Extracted page text marks headings with a leading '#'
+HEADING_PREFIX = '#'
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    heading: Optional[str] = None
+
+
+class TextChunker:
+    """Splits document text into overlapping chunks on sentence and heading boundaries.
+
+    Blocks are separated by blank lines and a block starting with '#' is a
+    heading, which always starts a new chunk and is carried along as the
+    chunk's section. Sentences are packed until a chunk reaches `chunk_tokens`;
+    the next chunk then repeats up to `overlap_tokens` of trailing sentences.
+    Sentences longer than a whole chunk are split on words.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: Optional[int] = None,
+        overlap_tokens: Optional[int] = None,
+        model: str = 'text-embedding-ada-002'
+    ):
+        self.chunk_tokens = chunk_tokens or int(os.getenv('PRAGMA_CHUNK_TOKENS', 300))
+        self.overlap_tokens = overlap_tokens if overlap_tokens is not None else int(os.getenv('PRAGMA_CHUNK_OVERLAP', 50))
+        self.model = model
+
+    def _split_long(self, sentence: str) -> List[str]:
+        """Split a sentence that does not fit in one chunk on word boundaries"""
+        pieces, current, current_tokens = [], [], 0
+        for word in sentence.split():
+            tokens = count_tokens(f" {word}", self.model)
+            if current and current_tokens + tokens > self.chunk_tokens:
+                pieces.append(' '.join(current))
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += tokens
+        if current:
+            pieces.append(' '.join(current))
+        return pieces
+
+    def _sentences(self, block: str) -> List[str]:
+        sentences = []
+        for sentence in SENTENCE_BOUNDARY.split(' '.join(block.split())):
+            if not sentence:
+                continue
+            if count_tokens(sentence, self.model) > self.chunk_tokens:
+                sentences.extend(self._split_long(sentence))
+            else:
+                sentences.append(sentence)
+        return sentences
+
+    def chunk(self, text: str) -> List[Chunk]:
+        chunks: List[Chunk] = []
+        heading: Optional[str] = None
+        current: List[Tuple[str, int]] = []  # (sentence, tokens) of the chunk being built
+        current_tokens = 0
+
+        def flush(keep_overlap: bool):
+            nonlocal current, current_tokens
+            if not current:
+                return
+            chunks.append(Chunk(index=len(chunks), text=' '.join(s for s, _ in current), heading=heading))
+            carried, carried_tokens = [], 0
+            if keep_overlap:
+                # Repeat trailing sentences so facts spanning the boundary stay together
+                for sentence, tokens in reversed(current):
+                    if carried_tokens + tokens > self.overlap_tokens:
+                        break
+                    carried.insert(0, (sentence, tokens))
+                    carried_tokens += tokens
+            current, current_tokens = carried, carried_tokens
+
+        for block in re.split(r'\n\s*\n', text):
+            block = block.strip()
+            if not block:
+                continue
+            if block.startswith(HEADING_PREFIX):
+                flush(keep_overlap=False)
+                heading = block.lstrip(HEADING_PREFIX).strip() or None
+                continue
+            for sentence in self._sentences(block):
+                tokens = count_tokens(sentence, self.model)
+                if current and current_tokens + tokens > self.chunk_tokens:
+                    flush(keep_overlap=True)
+                    # Drop the overlap if it leaves no room for the new sentence
+                    while current and current_tokens + tokens > self.chunk_tokens:
+                        current_tokens -= current.pop(0)[1]
+                current.append((sentence, tokens))
+                current_tokens += tokens
+        flush(keep_overlap=False)
+        return chunks
@@ -1,5 +1,5 @@
 import os
-from typing import Dict
+from typing import Any, Dict
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -37,4 +37,56 @@ class Config:
             'pinecone_api_key': os.getenv('PINECONE_API_KEY'),
             'pinecone_env': os.getenv('PINECONE_ENV'),
             'pinecone_index_name': os.getenv('PINECONE_INDEX_NAME')
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def get_cache_dir() -> Path:
+        """Get the root directory for local caches"""
+        Config.load_environment()
+        return Path(os.getenv('PRAGMA_CACHE_DIR', '.cache'))
+
+    @staticmethod
+    def get_vector_backend() -> str:
+        """Get the vector store backend: 'pinecone' or 'local'"""
+        Config.load_environment()
+        return os.getenv('PRAGMA_VECTOR_BACKEND', 'pinecone').lower()
+
+    @staticmethod
+    def get_embedding_settings() -> Dict[str, Any]:
+        """Get the embedding model and its optional shortened output size"""
+        Config.load_environment()
+        dimensions = os.getenv('PRAGMA_EMBEDDING_DIMENSIONS')
+        return {
+            'model': os.getenv('PRAGMA_EMBEDDING_MODEL', 'text-embedding-ada-002'),
+            'dimensions': int(dimensions) if dimensions else None
+        }
+
+    @staticmethod
+    def get_local_index_settings() -> Dict[str, Any]:
+        """Get local index options: ANN, quantized coarse codes and their width"""
+        Config.load_environment()
+        coarse_dimensions = os.getenv('PRAGMA_LOCAL_COARSE_DIMENSIONS')
+        return {
+            'approximate': os.getenv('PRAGMA_LOCAL_ANN') == '1',
+            'quantization': os.getenv('PRAGMA_LOCAL_QUANTIZATION') or None,
+            'coarse_dimensions': int(coarse_dimensions) if coarse_dimensions else None
+        }
+
+    @staticmethod
+    def get_llm_limits() -> Dict[str, int]:
+        """Get chat completion concurrency and per-minute request and token budgets"""
+        Config.load_environment()
+        return {
+            'max_concurrency': int(os.getenv('PRAGMA_LLM_CONCURRENCY', 32)),
+            'requests_per_minute': int(os.getenv('PRAGMA_LLM_RPM', 5_000)),
+            'tokens_per_minute': int(os.getenv('PRAGMA_LLM_TPM', 300_000))
+        }
+
+    @staticmethod
+    def get_answer_cache_settings() -> Dict[str, float]:
+        """Get the semantic answer cache's similarity threshold and maximum answer age"""
+        Config.load_environment()
+        return {
+            'threshold': float(os.getenv('PRAGMA_ANSWER_CACHE_THRESHOLD', 0.93)),
+            'max_age': float(os.getenv('PRAGMA_ANSWER_CACHE_MAX_AGE', 24 * 3600))
+        }
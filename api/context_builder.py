@@ -0,0 +1,181 @@
+import logging
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from typing import List, Optional, Set, Tuple
+
+import numpy as np
+
+from cache import QUERY_STOPWORDS
+from chunking import HEADING_PREFIX, SENTENCE_BOUNDARY
+from tokenizer import count_tokens
+
+# Mersenne prime for the MinHash permutations; products stay within int64
+MINHASH_PRIME = (1 << 31) - 1
+
+FIGURES_PATTERN = re.compile(r'[$%€£]|\d+(?:\.\d+)?\s*(?:billion|million|bn|m)\b|\b(?:19|20)\d{2}\b', re.IGNORECASE)
+
+
+@dataclass
+class PackedSource:
+    index: int  # position of the source in the input
+    text: str
+    tokens: int
+
+
+class ContextBuilder:
+    """Packs retrieved sources into a token budget for the LLM prompt.
+
+    Sources whose word shingles have an estimated Jaccard similarity of at
+    least `duplicate_threshold` to an earlier (better ranked) source are
+    dropped as near-duplicates, using MinHash signatures. The remaining
+    sources are split into sentences, sentences repeated word for word (up to
+    case, punctuation and spacing) are removed, and
+    sentences are scored by question-term overlap, figures and position.
+    Every source first gets its best sentence, then the best sentences overall
+    are added until `max_tokens` (counted with the model's tokenizer,
+    including each source's header) is reached. Kept sentences are emitted in
+    their original order, with '…' marking gaps.
+    """
+
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        model: str = 'gpt-4',
+        shingle_words: int = 5,
+        permutations: int = 64,
+        duplicate_threshold: float = 0.8,
+        seed: int = 0
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.max_tokens = max_tokens or int(os.getenv('PRAGMA_CONTEXT_TOKENS', 1000))
+        self.model = model
+        self.shingle_words = shingle_words
+        self.duplicate_threshold = duplicate_threshold
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MINHASH_PRIME, permutations, dtype=np.int64)
+        self._b = rng.integers(0, MINHASH_PRIME, permutations, dtype=np.int64)
+
+    @staticmethod
+    def _terms(text: str) -> Set[str]:
+        return {t for t in re.findall(r'\w+', text.lower()) if t not in QUERY_STOPWORDS and len(t) > 1}
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of the text's word shingles, or None for empty text"""
+        words = re.findall(r'\w+', text.lower())
+        if not words:
+            return None
+        size = min(self.shingle_words, len(words))
+        shingles = {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) & MINHASH_PRIME for shingle in shingles),
+            dtype=np.int64,
+            count=len(shingles)
+        )
+        return ((np.outer(hashes, self._a) + self._b) % MINHASH_PRIME).min(axis=0)
+
+    def unique_sources(self, contents: List[str]) -> List[int]:
+        """Indexes of the sources left after dropping near-duplicates of earlier ones"""
+        kept: List[int] = []
+        signatures: List[np.ndarray] = []
+        for i, content in enumerate(contents):
+            signature = self.signature(content)
+            if signature is None:
+                continue
+            if any(np.mean(signature == other) >= self.duplicate_threshold for other in signatures):
+                continue
+            kept.append(i)
+            signatures.append(signature)
+        return kept
+
+    @staticmethod
+    def _sentences(content: str) -> List[str]:
+        sentences = []
+        for block in re.split(r'\n\s*\n', content):
+            block = ' '.join(block.split()).lstrip(HEADING_PREFIX).strip()
+            sentences.extend(s for s in SENTENCE_BOUNDARY.split(block) if s)
+        return sentences
+
+    def _score(self, sentence: str, position: int, question_terms: Set[str], organization_terms: Set[str]) -> float:
+        terms = self._terms(sentence)
+        overlap = len(question_terms & terms) / len(question_terms) if question_terms else 0.0
+        score = overlap
+        if overlap and FIGURES_PATTERN.search(sentence):
+            score += 0.3
+        if organization_terms & terms:
+            score += 0.1
+        # Earlier sentences break ties, and lead the context when nothing matches
+        return score + 0.01 / (1 + position)
+
+    def pack(
+        self,
+        question: str,
+        organization: str,
+        contents: List[str],
+        header_tokens: Optional[List[int]] = None
+    ) -> List[PackedSource]:
+        """Question-relevant sentences of the distinct sources, within `max_tokens`"""
+        header_tokens = header_tokens or [0] * len(contents)
+        question_terms = self._terms(question)
+        organization_terms = self._terms(organization)
+        kept = self.unique_sources(contents)
+
+        # (score, source, position, sentence, tokens) for every distinct sentence
+        seen: Set[str] = set()
+        by_source: List[List[Tuple[float, int, int, str, int]]] = []
+        for source in kept:
+            candidates = []
+            for position, sentence in enumerate(self._sentences(contents[source])):
+                # Word order and every figure count: "grew 5%" and "grew 7%" are different evidence
+                key = ' '.join(re.findall(r'\w+', sentence.lower())) or sentence
+                if key in seen:
+                    continue
+                seen.add(key)
+                candidates.append((
+                    self._score(sentence, position, question_terms, organization_terms),
+                    source,
+                    position,
+                    sentence,
+                    count_tokens(sentence, self.model) + 1
+                ))
+            candidates.sort(key=lambda c: -c[0])
+            by_source.append(candidates)
+
+        # Best sentence of each source first, then the best of the rest overall
+        order = [candidates[0] for candidates in by_source if candidates]
+        order += sorted(
+            (candidate for candidates in by_source for candidate in candidates[1:]),
+            key=lambda c: -c[0]
+        )
+
+        used = 0
+        chosen = {}
+        for score, source, position, sentence, tokens in order:
+            cost = tokens + (header_tokens[source] if source not in chosen else 0)
+            if used + cost > self.max_tokens:
+                continue
+            used += cost
+            chosen.setdefault(source, []).append((position, sentence, tokens))
+
+        packed = []
+        for source in kept:
+            if source not in chosen:
+                continue
+            parts, previous = [], None
+            for position, sentence, _ in sorted(chosen[source]):
+                if previous is not None and position != previous + 1:
+                    parts.append('…')
+                parts.append(sentence)
+                previous = position
+            packed.append(PackedSource(
+                index=source,
+                text=' '.join(parts),
+                tokens=header_tokens[source] + sum(tokens for _, _, tokens in chosen[source])
+            ))
+
+        self.logger.debug(
+            f"Packed {len(contents)} sources into {used} tokens: "
+            f"{len(contents) - len(kept)} near-duplicates dropped, {len(packed)} kept"
+        )
+        return packed
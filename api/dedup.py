@@ -0,0 +1,65 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'ref', 'ref_src', 'cmpid', 'ncid', 'soc_src', 'soc_trk',
+    'sr_share', 'taid', 'guccounter', 'guce_referrer', 'guce_referrer_sig',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mkt_')
+
+
+def canonicalize_url(url: str) -> str:
+    """Canonical form of a URL used to recognise the same page across search results.
+
+    The scheme is folded to https, host and scheme are lowercased, default ports,
+    fragments, trailing slashes and tracking parameters are removed, and the
+    remaining query parameters are sorted.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    path = parts.path or '/'
+    while '//' in path:
+        path = path.replace('//', '/')
+    if len(path) > 1:
+        path = path.rstrip('/')
+
+    params = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query = urlencode(sorted(params))
+
+    return urlunsplit(('https', host, path, query, ''))
+
+
+class SingleFlight:
+    """Run the work for each key once and share the result with every caller.
+
+    Results stay memoized for the life of the instance, so one instance per run
+    means each key is computed at most once per run.
+    """
+
+    def __init__(self):
+        self.tasks: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self.tasks[key] = task
+        # Shield so one cancelled caller does not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        self.tasks.pop(key, None)
@@ -0,0 +1,100 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from config import Config
+
+
+class DocumentStore:
+    """Local SQLite store for the text behind indexed vectors.
+
+    Chunk text is kept here by vector ID, zlib-compressed, so vectors only carry
+    small filterable metadata. Retrieval fetches the text for its final matches
+    in one batched lookup.
+    """
+
+    def __init__(
+        self,
+        namespace: str = 'default',
+        cache_dir: Optional[Union[str, Path]] = None,
+        compression_level: int = 6
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.namespace = namespace
+        self.compression_level = compression_level
+        self.path = (Path(cache_dir) if cache_dir else Config.get_cache_dir()) / 'documents.sqlite3'
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS chunks ('
+                    'namespace TEXT, id TEXT, document_id TEXT, text BLOB, stored_at REAL, '
+                    'PRIMARY KEY (namespace, id))'
+                )
+                self._db.execute('CREATE INDEX IF NOT EXISTS chunks_document ON chunks (namespace, document_id)')
+                self._db.commit()
+            except Exception as e:
+                self.logger.warning(f"Document store unavailable: {str(e)}")
+                self._db = None
+        return self._db
+
+    def put_many(self, entries: Iterable[Tuple[str, str, str]]):
+        """Store (vector id, document id, text) entries"""
+        now = time.time()
+        rows = [
+            (self.namespace, vid, document_id, zlib.compress(text.encode('utf-8'), self.compression_level), now)
+            for vid, document_id, text in entries
+        ]
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                raise RuntimeError(f"Document store at {self.path} is unavailable")
+            if rows:
+                db.executemany('INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)', rows)
+                db.commit()
+
+    def get_many(self, ids: List[str]) -> Dict[str, str]:
+        """Text for the given vector IDs; unknown IDs are left out"""
+        texts: Dict[str, str] = {}
+        with self._lock:
+            db = self._connection()
+            if db is None or not ids:
+                return texts
+            unique = list(dict.fromkeys(ids))
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = db.execute(
+                    f"SELECT id, text FROM chunks WHERE namespace = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [self.namespace, *chunk]
+                ).fetchall()
+                for vid, blob in rows:
+                    texts[vid] = zlib.decompress(blob).decode('utf-8')
+        return texts
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            db.executemany(
+                'DELETE FROM chunks WHERE namespace = ? AND id = ?',
+                [(self.namespace, vid) for vid in ids]
+            )
+            db.commit()
+
+    def clear(self):
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            db.execute('DELETE FROM chunks WHERE namespace = ?', (self.namespace,))
+            db.commit()
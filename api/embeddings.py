@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from cache import EmbeddingCache, normalize_embedding_text
+from rate_limiter import AdaptiveLimiter, get_adaptive_limiter
+from tokenizer import count_tokens, truncate_tokens
+
+
+class EmbeddingEngine:
+    """Batched, non-blocking embeddings on the async OpenAI client.
+
+    Texts are packed in order into requests of at most `max_batch_size` inputs
+    and `max_batch_tokens` tokens. Batches run concurrently under the shared
+    adaptive limiter for the embeddings endpoint, which also retries each one
+    on its own. Embeddings come back in input order.
+
+    With a `cache`, only texts it has not seen for this model reach the API.
+    `dimensions` requests shortened embeddings from models that support it
+    (the text-embedding-3 family).
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        model: str = "text-embedding-ada-002",
+        max_batch_size: int = 256,
+        max_batch_tokens: int = 100_000,
+        max_input_tokens: int = 8191,
+        cache: Optional[EmbeddingCache] = None,
+        dimensions: Optional[int] = None,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        self.cache = cache
+        self.dimensions = dimensions
+        self.limiter = limiter or get_adaptive_limiter('openai-embeddings')
+
+    @property
+    def signature(self) -> str:
+        """Model and output size, which together determine an embedding"""
+        return f"{self.model}@{self.dimensions}" if self.dimensions else self.model
+
+    def _batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text indices into batches that respect the count and token limits"""
+        batches, current, current_tokens = [], [], 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text, self.model)
+            if current and (len(current) >= self.max_batch_size or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _embed_batch(self, inputs: List[str]) -> List[List[float]]:
+        extra = {'dimensions': self.dimensions} if self.dimensions else {}
+        response = await self.limiter.call(
+            lambda: self.client.embeddings.create(input=inputs, model=self.model, **extra)
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    async def embed(self, texts: List[str], raise_on_error: bool = True) -> List[Optional[List[float]]]:
+        """Embed `texts`, returning one embedding per text in the same order.
+
+        With `raise_on_error=False`, texts in batches that still fail after
+        retries get None instead of failing the whole call.
+        """
+        if not texts:
+            return []
+        # The API rejects empty strings and inputs over the model's token limit
+        inputs = [truncate_tokens(text, self.max_input_tokens, self.model) or " " for text in texts]
+
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        if self.cache is not None:
+            embeddings = await asyncio.to_thread(self.cache.get_many, self.signature, inputs)
+
+        # Embed each distinct uncached input once
+        pending: Dict[str, List[int]] = {}
+        for i, (text, embedding) in enumerate(zip(inputs, embeddings)):
+            if embedding is None:
+                pending.setdefault(normalize_embedding_text(text) or " ", []).append(i)
+        if not pending:
+            return embeddings
+
+        unique = list(pending)
+        batches = self._batches(unique)
+        outcomes = await asyncio.gather(
+            *(self._embed_batch([unique[i] for i in batch]) for batch in batches),
+            return_exceptions=True
+        )
+
+        fresh_texts, fresh_vectors = [], []
+        for batch, outcome in zip(batches, outcomes):
+            if isinstance(outcome, BaseException):
+                if raise_on_error:
+                    raise outcome
+                self.logger.error(f"Embedding batch of {len(batch)} texts failed: {str(outcome)}")
+                continue
+            for i, embedding in zip(batch, outcome):
+                fresh_texts.append(unique[i])
+                fresh_vectors.append(embedding)
+                for position in pending[unique[i]]:
+                    embeddings[position] = embedding
+
+        if self.cache is not None and fresh_texts:
+            await asyncio.to_thread(self.cache.put_many, self.signature, fresh_texts, fresh_vectors)
+        return embeddings
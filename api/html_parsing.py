@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+logger = logging.getLogger(__name__)
+
+# Parser backends in order of preference: lxml is a C tree builder and several
+# times faster than the pure-Python html.parser, which is always available.
+PARSER_BACKENDS = ('lxml', 'html.parser')
+
+# Upper bound on extracted text per page; retrieval works on chunks, not the whole page
+MAX_CONTENT_CHARS = 200_000
+
+# Headings are kept as their own '#'-prefixed blocks so chunking can split on them
+HEADING_TAGS = ('h1', 'h2', 'h3')
+
+
+@dataclass
+class ScrapedContent:
+    url: str
+    title: str
+    content: str
+    snippet: str
+
+
+def resolve_parser(preferred: Optional[str] = None) -> str:
+    """Return the preferred parser backend if installed, else the first available one"""
+    candidates = [preferred] if preferred else []
+    candidates.extend(PARSER_BACKENDS)
+    for parser in candidates:
+        try:
+            BeautifulSoup('<p></p>', parser)
+            return parser
+        except Exception:
+            continue
+    return 'html.parser'
+
+
+def extract_search_results(html_content: str, parser: str, max_results: int) -> List[Dict[str, str]]:
+    """Extract result URLs with their titles and snippets"""
+    soup = BeautifulSoup(html_content, parser)
+    results = []
+
+    # Find all search result divs
+    for result in soup.find_all('div', class_='g'):
+        try:
+            # Get the link
+            link = result.find('a', href=True)
+            if not link or not link['href'].startswith('http'):
+                continue
+
+            url = link['href']
+
+            # Skip unwanted domains
+            skip_domains = ['google.com', 'youtube.com', 'facebook.com', 'twitter.com']
+            if any(domain in url for domain in skip_domains):
+                continue
+
+            heading = result.find('h3')
+            title = heading.get_text(' ', strip=True) if heading else link.get_text(' ', strip=True)
+            snippet_node = (
+                result.find(attrs={'data-sncf': True})
+                or result.find('div', class_='VwiC3b')
+                or result.find('span', class_='aCOpRe')
+            )
+            if snippet_node:
+                snippet = snippet_node.get_text(' ', strip=True)
+            else:
+                snippet = result.get_text(' ', strip=True).replace(title, '', 1).strip()
+
+            results.append({'url': url, 'title': title, 'snippet': snippet[:500]})
+
+        except Exception as e:
+            logger.error(f"Error extracting URL: {str(e)}")
+            continue
+
+    return results[:max_results]
+
+
+def extract_content(html_content: str, url: str, parser: str) -> Optional[ScrapedContent]:
+    """Enhanced content extraction"""
+    try:
+        soup = BeautifulSoup(html_content, parser)
+
+        # Remove unwanted elements
+        for element in soup.find_all(['script', 'style', 'nav', 'footer', 'header', 'aside']):
+            element.decompose()
+
+        # First try to find article or main content
+        main_content = soup.find('article') or soup.find('main')
+        if main_content:
+            paragraphs = main_content.find_all(['p', 'h1', 'h2', 'h3', 'table'])
+        else:
+            paragraphs = soup.find_all(['p', 'h1', 'h2', 'h3', 'table'])
+
+        # Extract title as a plain str so the result pickles without the tree
+        title = str(soup.title.string) if soup.title and soup.title.string else ''
+
+        # Process paragraphs
+        content_parts = []
+        blocks = []
+        for p in paragraphs:
+            text = p.get_text(strip=True)
+            if p.name in HEADING_TAGS:
+                if len(text) > 3:
+                    blocks.append(f"# {text}")
+                continue
+            # Keep only substantial paragraphs
+            if len(text) > 30 and not any(skip in text.lower() for skip in ['cookie', 'subscribe', 'privacy policy']):
+                content_parts.append(text)
+                blocks.append(text)
+
+        if not content_parts:
+            return None
+
+        # One block per paragraph or heading, separated by blank lines
+        content = '\n\n'.join(blocks)
+
+        # Create a focused snippet
+        snippet = ' '.join(content_parts[:3])  # First three substantial paragraphs
+
+        return ScrapedContent(
+            url=url,
+            title=title,
+            content=content[:MAX_CONTENT_CHARS],  # Limit content length
+            snippet=snippet[:500]  # Limit snippet length
+        )
+
+    except Exception as e:
+        logger.error(f"Error extracting content from {url}: {str(e)}")
+        return None
+
+
+class HTMLParserPool:
+    """Runs HTML extraction in a process pool so parsing never blocks the event loop.
+
+    `max_workers=0` parses inline in the calling process, which is mainly useful
+    for debugging and benchmarks.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, parser: Optional[str] = None):
+        if max_workers is None:
+            max_workers = int(os.getenv('PRAGMA_PARSER_WORKERS', min(4, os.cpu_count() or 1)))
+        self.max_workers = max_workers
+        self.parser = resolve_parser(parser or os.getenv('PRAGMA_HTML_PARSER'))
+        self.executor = None
+        if max_workers > 0:
+            # spawn avoids forking a process that already runs an event loop and threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        logger.info(f"HTML parsing with {self.parser} on {max_workers} worker processes")
+
+    async def _run(self, func: Callable, *args):
+        if self.executor is None:
+            return func(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    async def extract_search_results(self, html_content: str, max_results: int) -> List[Dict[str, str]]:
+        return await self._run(extract_search_results, html_content, self.parser, max_results)
+
+    async def extract_content(self, html_content: str, url: str) -> Optional[ScrapedContent]:
+        return await self._run(extract_content, html_content, url, self.parser)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+
+_shared_pool: Optional[HTMLParserPool] = None
+
+
+def get_parser_pool() -> HTMLParserPool:
+    """Process-wide parser pool, created on first use"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = HTMLParserPool()
+    return _shared_pool
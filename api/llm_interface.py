@@ -6,11 +6,13 @@ import os
 from datetime import datetime
 from schemas import AnalysisResult, SearchResult
 import logging
-from tenacity import retry, stop_after_attempt, wait_exponential
+from rate_limiter import get_adaptive_limiter
 
 class LLMInterface:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # Retries are left to the shared adaptive limiter
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        self.limiter = get_adaptive_limiter('openai-chat')
         self.logger = logging.getLogger(__name__)
         
         # Configure default parameters
@@ -30,7 +32,6 @@ class LLMInterface:
             and industry dynamics. Focus on market share, growth opportunities, and competitive advantages."""
         }
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=10))
     async def analyze_content(
         self,
         question: str,
@@ -38,7 +39,7 @@ class LLMInterface:
         search_results: List[SearchResult],
         analysis_type: str = 'financial_analysis'
     ) -> AnalysisResult:
-        """Analyze content using GPT-4 with retry logic and structured output"""
+        """Analyze content using GPT-4 with structured output"""
         
         # Prepare context from search results
         context = self._prepare_context(search_results)
@@ -67,14 +68,14 @@ class LLMInterface:
     async def _make_api_call(self, messages: List[Dict[str, str]]) -> Dict:
         """Make the API call to OpenAI with proper error handling"""
         try:
-            response = await asyncio.to_thread(
+            response = await self.limiter.call(lambda: asyncio.to_thread(
                 self.client.chat.completions.create,
                 model=self.default_model,
                 messages=messages,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
                 response_format={"type": "json_object"}
-            )
+            ))
             return json.loads(response.choices[0].message.content)
         except Exception as e:
             self.logger.error(f"OpenAI API call failed: {str(e)}")
@@ -141,27 +142,25 @@ Focus on providing accurate, well-supported conclusions based on the provided co
         search_results: Dict[str, Dict[str, List[SearchResult]]]
     ) -> Dict[str, Dict[str, AnalysisResult]]:
         """Batch process multiple questions and organizations"""
-        results = {}
-        
-        for question in questions:
-            results[question] = {}
-            for org in organizations:
-                try:
-                    org_results = search_results.get(question, {}).get(org, [])
-                    if org_results:
-                        results[question][org] = await self.analyze_content(
-                            question=question,
-                            organization=org,
-                            search_results=org_results
-                        )
-                    else:
-                        self.logger.warning(f"No search results found for {question} - {org}")
-                except Exception as e:
-                    self.logger.error(f"Error analyzing {question} for {org}: {str(e)}")
-                    results[question][org] = None
-                
-                # Add delay between requests to avoid rate limiting
-                await asyncio.sleep(0.5)
+        results = {question: {} for question in questions}
+
+        async def analyze(question: str, org: str):
+            try:
+                org_results = search_results.get(question, {}).get(org, [])
+                if org_results:
+                    results[question][org] = await self.analyze_content(
+                        question=question,
+                        organization=org,
+                        search_results=org_results
+                    )
+                else:
+                    self.logger.warning(f"No search results found for {question} - {org}")
+            except Exception as e:
+                self.logger.error(f"Error analyzing {question} for {org}: {str(e)}")
+                results[question][org] = None
+
+        # The adaptive limiter paces the requests
+        await asyncio.gather(*(analyze(question, org) for question in questions for org in organizations))
         
         return results
 
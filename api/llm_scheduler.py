@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from config import Config
+from rate_limiter import AdaptiveLimiter, TokenBucket, get_adaptive_limiter
+from tokenizer import count_tokens
+
+# Per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMER_TOKENS = 3
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    failures: int = 0
+    estimated_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    queued_seconds: float = 0.0
+
+
+class CompletionScheduler:
+    """Runs chat completions concurrently within per-minute request and token budgets.
+
+    Each request first takes one of `max_concurrency` slots, then one request
+    from the requests-per-minute bucket and its estimated tokens from the
+    tokens-per-minute bucket. The estimate is the prompt counted with the
+    model's tokenizer plus `max_tokens` (or `expected_completion_tokens`),
+    which is how the API charges the budget; the difference to the actual
+    usage is refunded once the response arrives.
+
+    `max_concurrency` is only a ceiling; the shared adaptive limiter for the
+    chat endpoint finds the concurrency the provider sustains and retries
+    failed calls. Budgets belong to the API key, so callers share one
+    scheduler through `get_completion_scheduler`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        requests_per_minute: int = 5_000,
+        tokens_per_minute: int = 300_000,
+        expected_completion_tokens: int = 1000,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.max_concurrency = max_concurrency
+        self.expected_completion_tokens = expected_completion_tokens
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute)
+        self.limiter = limiter or get_adaptive_limiter('openai-chat')
+        self.stats = SchedulerStats()
+        self._semaphore = None
+
+    def estimate_tokens(self, messages: List[Dict[str, str]], model: str, max_tokens: Optional[int] = None) -> int:
+        """Tokens a request will count against the budget: prompt plus completion allowance"""
+        prompt = sum(count_tokens(message.get('content') or '', model) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+        return prompt + REPLY_PRIMER_TOKENS + (max_tokens or self.expected_completion_tokens)
+
+    async def complete(self, client, model: str, messages: List[Dict[str, str]], **kwargs):
+        """Create a chat completion with `client` once a slot and enough budget are free"""
+        # A request larger than the whole bucket could never be admitted
+        estimate = min(self.estimate_tokens(messages, model, kwargs.get('max_tokens')), self.tokens.capacity)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            await self.requests.acquire()
+            await self.tokens.acquire(estimate)
+            self.stats.queued_seconds += time.monotonic() - queued_at
+            self.stats.requests += 1
+            self.stats.estimated_tokens += estimate
+            try:
+                response = await self.limiter.call(
+                    lambda: client.chat.completions.create(model=model, messages=messages, **kwargs)
+                )
+            except Exception:
+                self.stats.failures += 1
+                raise
+
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self.stats.prompt_tokens += usage.prompt_tokens
+            self.stats.completion_tokens += usage.completion_tokens
+            if usage.total_tokens < estimate:
+                self.tokens.refund(estimate - usage.total_tokens)
+        return response
+
+
+_shared_scheduler: Optional[CompletionScheduler] = None
+
+
+def get_completion_scheduler() -> CompletionScheduler:
+    """Process-wide scheduler, so concurrent requests draw on the same budgets"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        _shared_scheduler = CompletionScheduler(**Config.get_llm_limits())
+    return _shared_scheduler
@@ -1,11 +1,18 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List
+import json
+from dataclasses import asdict
 import logging
 from scraper import WebScraper
 from rag_processor import EnhancedRAGProcessor
-from schemas import QueryRequest
+from pipeline import MatrixPipeline
+from schemas import FalseHitReport, QueryRequest
+from cache import get_answer_cache, get_embedding_cache, get_response_cache
+from llm_scheduler import get_completion_scheduler
+from rate_limiter import adaptive_limiter_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -35,38 +42,23 @@ async def analyze_data(request: QueryRequest):
         logger.info(f"Processing request with {len(request.questions)} questions and {len(request.organizations)} organizations")
         
         # Initialize services
-        scraper = WebScraper()
+        scraper = WebScraper(snippet_only=request.snippet_only)
         rag = EnhancedRAGProcessor()
+        pipeline = MatrixPipeline(scraper, rag)
         
-        # Get search results
+        # Search, scrape, index and analyze as one streaming pipeline
         try:
-            search_results = await scraper.scrape_matrix(
+            results_df = await pipeline.run(
                 request.questions,
                 request.organizations
             )
-            logger.info(f"Successfully scraped {len(search_results)} results")
+            logger.info(f"Successfully processed {len(results_df)} cells")
             
         except Exception as e:
-            logger.error(f"Scraping error: {str(e)}")
+            logger.error(f"Pipeline error: {str(e)}")
             raise HTTPException(
                 status_code=500,
-                detail=f"Error during web scraping: {str(e)}"
-            )
-        
-        # Process with RAG
-        try:
-            results_df = await rag.process_data_matrix(
-                request.questions,
-                request.organizations,
-                search_results  # Pass the search_results here
-            )
-            logger.info("Successfully processed data with RAG")
-            
-        except Exception as e:
-            logger.error(f"RAG processing error: {str(e)}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error during RAG processing: {str(e)}"
+                detail=f"Error during analysis pipeline: {str(e)}"
             )
         
         # Convert to CSV
@@ -91,4 +83,51 @@ async def analyze_data(request: QueryRequest):
         raise HTTPException(
             status_code=500,
             detail=f"An unexpected error occurred: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@app.post("/api/analyze/stream")
+async def analyze_data_stream(request: QueryRequest):
+    """Stream result rows as newline-delimited JSON as soon as each cell completes"""
+    logger.info(f"Streaming request with {len(request.questions)} questions and {len(request.organizations)} organizations")
+    
+    pipeline = MatrixPipeline(WebScraper(snippet_only=request.snippet_only), EnhancedRAGProcessor())
+    
+    async def rows():
+        async for row in pipeline.stream(request.questions, request.organizations):
+            yield json.dumps(row) + "\n"
+    
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@app.get("/api/embeddings/stats")
+def embedding_cache_stats():
+    return get_embedding_cache().stats()
+
+
+@app.get("/api/llm/stats")
+def llm_scheduler_stats():
+    return asdict(get_completion_scheduler().stats)
+
+
+@app.get("/api/llm/cache/stats")
+def llm_response_cache_stats():
+    return get_response_cache().stats()
+
+
+@app.get("/api/answers/stats")
+def answer_cache_stats():
+    return get_answer_cache().stats()
+
+
+@app.post("/api/answers/false-hit")
+def report_false_hit(report: FalseHitReport):
+    """Flag the cached answer served for a question as wrong for it"""
+    if not get_answer_cache().report_false_hit(report.organization, report.question):
+        raise HTTPException(status_code=404, detail="No cached answer was served for this question")
+    return {"status": "recorded"}
+
+
+@app.get("/api/limits/stats")
+def adaptive_limit_stats():
+    return adaptive_limiter_stats()
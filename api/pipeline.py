@@ -0,0 +1,382 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from dedup import canonicalize_url
+from html_parsing import ScrapedContent
+from ranking import SearchCandidate
+from rag_processor import EnhancedRAGProcessor
+from scraper import WebScraper, merge_search_results
+
+
+@dataclass(eq=False)
+class PairState:
+    """Progress of one question-organization cell through the pipeline"""
+    question: str
+    organization: str
+    pending_pages: int = 0
+    search_done: bool = False
+    released: bool = False
+
+
+@dataclass(eq=False)
+class OrgState:
+    """Planned searches for one organization and the result pool they fill"""
+    organization: str
+    pairs: List[PairState] = field(default_factory=list)
+    pending_searches: int = 0
+    results: List[List[Dict[str, str]]] = field(default_factory=list)
+
+
+@dataclass(eq=False)
+class PageState:
+    """A unique page shared by every cell whose search returned it"""
+    url: str
+    subscribers: List[Tuple[PairState, float]] = field(default_factory=list)  # (cell, relevance score)
+    done: bool = False
+    content: Optional[ScrapedContent] = None
+
+
+@dataclass(eq=False)
+class DocumentState:
+    """An organization's document, indexed once for every cell that found it"""
+    doc_id: str
+    pairs: List[PairState] = field(default_factory=list)
+    done: bool = False
+
+
+@dataclass
+class Job:
+    """Unit of work passed between stages"""
+    pair: Optional[PairState] = None
+    url: Optional[str] = None
+    payload: Any = None
+    done: bool = False  # forwarded or finished; a later failure no longer accounts for it
+
+
+class MatrixPipeline:
+    """Streaming producer/consumer pipeline for a questions x organizations matrix.
+
+    Stages are connected by bounded queues and each has its own worker pool:
+
+        search -> fetch -> extract -> embed -> upsert -> retrieve -> llm
+
+    Searches follow the scraper's per-organization query plan: once all of an
+    organization's searches are back, their pooled results are ranked for each
+    of its questions. Pages flow downstream as soon as they are fetched. A cell enters retrieval
+    once every page found for it has been upserted (or dropped), so the first
+    answers arrive while slower pages for other cells are still downloading.
+    Each canonical URL is fetched and extracted once per run; its content then
+    fans out to every cell that found it. Document vectors do not depend on the
+    question, so each organization's copy of a page is embedded and upserted
+    once and releases all of that organization's cells waiting on it.
+    Released cells are retrieved in batches: one embedding call and one
+    round of concurrent vector queries for every cell ready at that moment.
+    Cells whose question was already answered for the organization, in any
+    phrasing, are served from the rag processor's answer cache up front.
+    A pipeline instance runs one matrix at a time.
+    """
+
+    STAGES = ('search', 'fetch', 'extract', 'embed', 'upsert', 'retrieve', 'llm')
+    PAGE_STAGES = ('fetch', 'extract', 'embed', 'upsert')
+
+    DEFAULT_CONCURRENCY = {
+        'search': 4,
+        'fetch': 16,
+        'extract': 4,
+        'embed': 4,
+        'upsert': 2,
+        'retrieve': 2,
+        'llm': 32,  # the rag processor's completion scheduler enforces the real limits
+    }
+
+    DEFAULT_BATCH_SIZES = {
+        'embed': 64,
+        'upsert': 50,
+        'retrieve': 32,
+    }
+
+    def __init__(
+        self,
+        scraper: WebScraper,
+        rag: EnhancedRAGProcessor,
+        queue_size: int = 64,
+        concurrency: Optional[Dict[str, int]] = None,
+        batch_sizes: Optional[Dict[str, int]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.scraper = scraper
+        self.rag = rag
+        self.queue_size = queue_size
+        self.concurrency = {**self.DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.batch_sizes = {**self.DEFAULT_BATCH_SIZES, **(batch_sizes or {})}
+
+        self.handlers: Dict[str, Callable] = {
+            'search': self._search,
+            'fetch': self._fetch,
+            'extract': self._extract,
+            'embed': self._embed,
+            'upsert': self._upsert,
+            'retrieve': self._retrieve,
+            'llm': self._llm,
+        }
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.rows: Optional[asyncio.Queue] = None
+        self.pages: Dict[str, PageState] = {}
+        self.documents: Dict[str, DocumentState] = {}
+
+    async def run(self, questions: List[str], organizations: List[str]) -> pd.DataFrame:
+        """Process the whole matrix and return rows in question x organization order"""
+        order = {
+            (question, org): i
+            for i, (question, org) in enumerate(
+                (question, org) for question in questions for org in organizations
+            )
+        }
+        rows = [row async for row in self.stream(questions, organizations)]
+        rows.sort(key=lambda row: order[(row['Question'], row['Organization'])])
+        return pd.DataFrame(rows)
+
+    async def stream(self, questions: List[str], organizations: List[str]) -> AsyncIterator[Dict]:
+        """Yield result rows as individual cells complete"""
+        pairs = [PairState(question, org) for question in questions for org in organizations]
+        self.queues = {stage: asyncio.Queue(self.queue_size) for stage in self.STAGES}
+        self.rows = asyncio.Queue()
+        self.pages = {}
+        self.documents = {}
+        start_time = time.monotonic()
+
+        # Cells answered before for a paraphrase of the question skip search and the LLM
+        cached = await self.rag.cached_answers([(pair.question, pair.organization) for pair in pairs])
+        for row in cached:
+            if row is not None:
+                self.rows.put_nowait(row)
+        pending = [pair for pair, row in zip(pairs, cached) if row is None]
+
+        async with self.scraper:
+            workers = [
+                asyncio.create_task(self._worker(stage))
+                for stage in self.STAGES
+                for _ in range(self.concurrency[stage])
+            ]
+            feeder = asyncio.create_task(self._feed(pending))
+            try:
+                for i in range(len(pairs)):
+                    row = await self.rows.get()
+                    if i == 0:
+                        self.logger.info(f"First cell ready after {time.monotonic() - start_time:.2f}s")
+                    yield row
+            finally:
+                for task in [feeder, *workers]:
+                    task.cancel()
+                await asyncio.gather(feeder, *workers, return_exceptions=True)
+
+        self.logger.info(f"Processed {len(pairs)} cells in {time.monotonic() - start_time:.2f}s")
+
+    async def _feed(self, pairs: List[PairState]):
+        orgs: Dict[str, OrgState] = {}
+        for pair in pairs:
+            orgs.setdefault(pair.organization, OrgState(pair.organization)).pairs.append(pair)
+
+        for org_state in orgs.values():
+            questions = list(dict.fromkeys(pair.question for pair in org_state.pairs))
+            plans = self.scraper.planner.plan_organization(questions, org_state.organization)
+            org_state.pending_searches = len(plans)
+            for plan in plans:
+                await self.queues['search'].put(Job(payload=(org_state, plan)))
+
+    async def _next_batch(self, stage: str) -> List[Job]:
+        """Wait for one job, then take whatever else is already queued up to the batch size"""
+        inbox = self.queues[stage]
+        jobs = [await inbox.get()]
+        while len(jobs) < self.batch_sizes.get(stage, 1) and not inbox.empty():
+            jobs.append(inbox.get_nowait())
+        return jobs
+
+    async def _worker(self, stage: str):
+        handler = self.handlers[stage]
+        while True:
+            jobs = await self._next_batch(stage)
+            try:
+                await handler(jobs)
+            except Exception as e:
+                self.logger.error(f"Pipeline stage {stage} failed: {str(e)}")
+                for job in jobs:
+                    await self._fail(stage, job, e)
+
+    async def _fail(self, stage: str, job: Job, error: Exception):
+        """Account for a job that will not continue downstream"""
+        if job.done:
+            return
+        job.done = True
+        if stage == 'search':
+            await self._search_done(job.payload[0])
+        elif stage in ('fetch', 'extract'):
+            await self._page_finished(job.payload if stage == 'fetch' else job.payload[0], None)
+        elif stage in self.PAGE_STAGES:
+            await self._document_done(job.payload[0])
+        else:
+            await self.rows.put(
+                self.rag.error_row(job.pair.question, job.pair.organization, error)
+            )
+
+    async def _page_done(self, pair: PairState):
+        pair.pending_pages -= 1
+        await self._release_if_ready(pair)
+
+    async def _release_if_ready(self, pair: PairState):
+        """Send a cell to retrieval once all of its pages are indexed or dropped"""
+        if pair.search_done and pair.pending_pages == 0 and not pair.released:
+            pair.released = True
+            await self.queues['retrieve'].put(Job(pair))
+
+    async def _deliver(self, page: PageState, pair: PairState, relevance_score: float):
+        """Hand extracted page content to one cell"""
+        if page.content:
+            result = self.scraper.build_result(
+                pair.question, pair.organization, page.url, page.content, relevance_score
+            )
+            await self._index(pair, page.url, result)
+        else:
+            await self._page_done(pair)
+
+    async def _index(self, pair: PairState, url: str, result):
+        """Queue a cell's document for indexing unless another cell already did"""
+        doc_id = self.rag.document_id(result)
+        document = self.documents.get(doc_id)
+        if document is None:
+            document = self.documents[doc_id] = DocumentState(doc_id)
+            document.pairs.append(pair)
+            await self.queues['embed'].put(Job(pair, url=url, payload=(document, result)))
+            return
+
+        await self.rag.link_results([result])
+        if document.done:
+            await self._page_done(pair)
+        else:
+            document.pairs.append(pair)
+
+    async def _document_done(self, document: DocumentState):
+        """A document is indexed, unchanged or dropped: release every cell waiting on it"""
+        if document.done:
+            return
+        document.done = True
+        for pair in list(document.pairs):
+            await self._page_done(pair)
+
+    async def _page_finished(self, page: PageState, content: Optional[ScrapedContent]):
+        if page.done:
+            return
+        page.done = True
+        page.content = content
+        # Cells subscribing from here on see `done` and deliver to themselves
+        for pair, relevance_score in list(page.subscribers):
+            await self._deliver(page, pair, relevance_score)
+
+    async def _search(self, jobs: List[Job]):
+        for job in jobs:
+            org_state, plan = job.payload
+            org_state.results.append(await self.scraper.search_raw(plan.query))
+            job.done = True
+            await self._search_done(org_state)
+
+    async def _search_done(self, org_state: OrgState):
+        """Rank the organization's pooled results per question once all its searches are back"""
+        org_state.pending_searches -= 1
+        if org_state.pending_searches > 0:
+            return
+        pool = merge_search_results(org_state.results)
+        for pair in org_state.pairs:
+            try:
+                candidates = self.scraper.rank_candidates(pool, pair.question, pair.organization)
+            except Exception as e:
+                self.logger.error(f"Ranking failed for {pair.organization} - {pair.question}: {str(e)}")
+                candidates = []
+            await self._subscribe(pair, candidates)
+
+    async def _subscribe(self, pair: PairState, candidates: List[SearchCandidate]):
+        """Route a cell's selected candidates to the pages it needs"""
+        for candidate in candidates:
+            if self.scraper.snippet_only:
+                # Fast mode: the snippet is the content, nothing is fetched
+                result = self.scraper.build_snippet_result(pair.question, pair.organization, candidate)
+                pair.pending_pages += 1
+                await self._index(pair, candidate.url, result)
+                continue
+            
+            key = canonicalize_url(candidate.url)
+            page = self.pages.get(key)
+            if page is None:
+                page = self.pages[key] = PageState(candidate.url)
+                pair.pending_pages += 1
+                page.subscribers.append((pair, candidate.score))
+                await self.queues['fetch'].put(Job(pair, url=candidate.url, payload=page))
+            elif all(subscriber is not pair for subscriber, _ in page.subscribers):
+                pair.pending_pages += 1
+                page.subscribers.append((pair, candidate.score))
+                if page.done:
+                    await self._deliver(page, pair, candidate.score)
+        pair.search_done = True
+        await self._release_if_ready(pair)
+
+    async def _fetch(self, jobs: List[Job]):
+        for job in jobs:
+            page = job.payload
+            html_content = await self.scraper._fetch_url(page.url)
+            job.done = True
+            if html_content:
+                await self.queues['extract'].put(Job(job.pair, url=page.url, payload=(page, html_content)))
+            else:
+                await self._page_finished(page, None)
+
+    async def _extract(self, jobs: List[Job]):
+        for job in jobs:
+            page, html_content = job.payload
+            content = await self.scraper.extract_page(page.url, html_content)
+            job.done = True
+            await self._page_finished(page, content)
+
+    async def _embed(self, jobs: List[Job]):
+        # One batched embedding call for everything queued up
+        vectors = await self.rag.vectorize_results([job.payload[1] for job in jobs])
+        for job, document_vectors in zip(jobs, vectors):
+            document = job.payload[0]
+            job.done = True
+            if document_vectors:
+                await self.queues['upsert'].put(Job(job.pair, url=job.url, payload=(document, document_vectors)))
+            else:
+                await self._document_done(document)
+
+    async def _upsert(self, jobs: List[Job]):
+        await self.rag.upsert_vectors([vector for job in jobs for vector in job.payload[1]])
+        for job in jobs:
+            job.done = True
+            await self._document_done(job.payload[0])
+
+    async def _retrieve(self, jobs: List[Job]):
+        results = await self.rag.query_matrix([(job.pair.question, job.pair.organization) for job in jobs])
+        for job, matches in zip(jobs, results):
+            pair = job.pair
+            if not matches:
+                error = ValueError(f"No relevant content found for {pair.organization} - {pair.question}")
+                await self._fail('retrieve', job, error)
+                continue
+            job.done = True
+            await self.queues['llm'].put(Job(pair, payload=matches))
+
+    async def _llm(self, jobs: List[Job]):
+        for job in jobs:
+            pair = job.pair
+            processed_result = await self.rag.process_with_llm(
+                job.payload, pair.question, pair.organization
+            )
+            row = self.rag.build_row(pair.question, pair.organization, processed_result)
+            # Fallback rows for unparseable output must not be served to paraphrases
+            if self.rag.is_valid_answer(processed_result):
+                await self.rag.remember_answer(pair.question, pair.organization, row)
+            job.done = True
+            await self.rows.put(row)
@@ -0,0 +1,111 @@
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+from urllib.parse import quote_plus
+
+from cache import QUERY_STOPWORDS
+
+
+@dataclass
+class QueryPlan:
+    """One search issued for an organization on behalf of a group of questions"""
+    organization: str
+    query: str
+    questions: List[str] = field(default_factory=list)
+
+
+class QueryPlanner:
+    """Plans a small set of searches per organization instead of one per question.
+
+    Questions about an organization are grouped by topic and every group becomes
+    one broader search built from the topic keywords and the group's most common
+    question terms. A group holding a single question keeps the targeted query
+    from `construct_query`. Groups beyond `max_searches_per_org` are merged, so
+    the number of searches scales with organizations rather than with pairs.
+    """
+
+    TOPICS = {
+        'financial results': ['revenue', 'sales', 'income', 'profit', 'margin', 'earnings', 'eps',
+                              'ebitda', 'growth', 'cash', 'debt', 'dividend', 'guidance', 'expenses',
+                              'cost', 'valuation', 'assets', 'funding', 'budget', 'endowment'],
+        'company overview': ['employees', 'headcount', 'headquarters', 'ceo', 'founded', 'products',
+                             'customers', 'market', 'share', 'competitors', 'strategy', 'students',
+                             'enrollment', 'staff', 'leadership', 'president'],
+        'risk and regulation': ['risk', 'lawsuit', 'litigation', 'regulation', 'regulatory', 'fine',
+                                'investigation', 'compliance', 'closure', 'closed', 'recall'],
+        'sustainability': ['esg', 'emissions', 'carbon', 'climate', 'sustainability', 'diversity',
+                           'renewable', 'environmental'],
+    }
+
+    # Question filler that says nothing about what to search for
+    FILLER_TERMS = {'any', 'many', 'much', 'they', 'them', 'there', 'current', 'latest', 'recent'}
+
+    def __init__(
+        self,
+        construct_query: Callable[[str, str], str],
+        max_searches_per_org: int = 3,
+        max_terms: int = 8
+    ):
+        self.construct_query = construct_query
+        self.max_searches_per_org = max_searches_per_org
+        self.max_terms = max_terms
+
+    @classmethod
+    def _terms(cls, text: str) -> List[str]:
+        return [
+            t for t in re.findall(r'\w+', text.lower())
+            if t not in QUERY_STOPWORDS and t not in cls.FILLER_TERMS and len(t) > 1
+            and not re.fullmatch(r'(?:19|20)\d{2}', t)
+        ]
+
+    def _topic(self, question: str) -> str:
+        # Match plurals such as "lawsuits" against singular keywords
+        terms = {t[:-1] if t.endswith('s') else t for t in self._terms(question)} | set(self._terms(question))
+        best_topic, best_hits = 'general', 0
+        for topic, keywords in self.TOPICS.items():
+            hits = len(terms.intersection(keywords))
+            if hits > best_hits:
+                best_topic, best_hits = topic, hits
+        return best_topic
+
+    def _broad_query(self, organization: str, topic: str, questions: List[str]) -> str:
+        org_terms = set(self._terms(organization))
+        counts = Counter(
+            term for question in questions for term in dict.fromkeys(self._terms(question))
+            if term not in org_terms
+        )
+        terms = [term for term, _ in counts.most_common(self.max_terms)]
+        topic_terms = [] if topic == 'general' else [topic]
+        query = f"{organization} {' '.join(topic_terms + terms)} 2023 OR 2024"
+        return quote_plus(query)
+
+    def plan_organization(self, questions: List[str], organization: str) -> List[QueryPlan]:
+        groups: Dict[str, List[str]] = {}
+        for question in questions:
+            groups.setdefault(self._topic(question), []).append(question)
+
+        # Keep the largest groups and fold the rest into the last one kept
+        ordered = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)
+        if len(ordered) > self.max_searches_per_org:
+            kept = ordered[:self.max_searches_per_org]
+            overflow = [q for _, group in ordered[self.max_searches_per_org:] for q in group]
+            kept[-1] = ('general', kept[-1][1] + overflow)
+            ordered = kept
+
+        plans = []
+        for topic, group in ordered:
+            if len(group) == 1:
+                query = self.construct_query(group[0], organization)
+            else:
+                query = self._broad_query(organization, topic, group)
+            plans.append(QueryPlan(organization=organization, query=query, questions=group))
+        return plans
+
+    def plan(self, questions: List[str], organizations: List[str]) -> List[QueryPlan]:
+        """Searches to run for a whole matrix"""
+        return [
+            plan
+            for organization in organizations
+            for plan in self.plan_organization(questions, organization)
+        ]
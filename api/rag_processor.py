@@ -1,14 +1,28 @@
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Tuple
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dataclasses import dataclass
 import json
 import pandas as pd
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from pinecone import Pinecone
 from datetime import datetime
-from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
 from config import Config
+from cache import ResponseCache, get_answer_cache, get_embedding_cache, get_response_cache
+from embeddings import EmbeddingEngine
+from llm_scheduler import get_completion_scheduler
+from dedup import canonicalize_url
+from document_store import DocumentStore
+from chunking import TextChunker
+from context_builder import ContextBuilder
+from ranking import MIN_RELEVANCE_SCORE
+from tokenizer import count_tokens
+from rate_limiter import get_adaptive_limiter
+from upsert_writer import UpsertWriter
+from vector_backends import get_local_index
+from vector_manifest import VectorManifest, content_hash, document_vector_id
 
 logger = logging.getLogger(__name__)
 
@@ -21,37 +35,52 @@ class EnhancedSearchResult:
     timestamp: datetime = datetime.now()
     content_type: str = "webpage"
     relevance_score: float = 0.5
+    snippet: bool = False
 
 class EnhancedRAGProcessor:
+    INVALID_RESPONSE_ANSWER = "Error: Invalid response format"
+
     def __init__(self):
         try:
             # Load and validate all required API keys
             api_keys = Config.get_api_keys()
             
-            # Initialize OpenAI client
+            # Initialize OpenAI client; retries are left to the shared adaptive limiters
             self.openai_client = OpenAI(
-                api_key=api_keys['openai_api_key']
+                api_key=api_keys['openai_api_key'],
+                max_retries=0
             )
-            
-            # Initialize Pinecone
-            self.pc = Pinecone(
-                api_key=api_keys['pinecone_api_key'],
-                environment=api_keys['pinecone_env']
+            self.async_openai_client = AsyncOpenAI(
+                api_key=api_keys['openai_api_key'],
+                max_retries=0
+            )
+            embedding = Config.get_embedding_settings()
+            self.embedding_dimensions = embedding['dimensions']
+            self.llm_scheduler = get_completion_scheduler()
+            self.embedder = EmbeddingEngine(
+                self.async_openai_client,
+                model=embedding['model'],
+                cache=get_embedding_cache(),
+                dimensions=self.embedding_dimensions
             )
+            self.chunker = TextChunker(model=embedding['model'])
+            self.max_chunks_per_document = 2
+            self.max_query_concurrency = 32
+            self._query_executor = None
             
-            # Get or create Pinecone index
-            index_name = api_keys['pinecone_index_name']
-            try:
-                self.index = self.pc.Index(index_name)
-            except Exception as e:
-                logger.warning(f"Error accessing index: {str(e)}")
-                logger.info("Attempting to create new index...")
-                self.pc.create_index(
-                    name=index_name,
-                    dimension=1536,  # dimension for text-embedding-ada-002
-                    metric="cosine"
-                )
-                self.index = self.pc.Index(index_name)
+            index_name = api_keys['pinecone_index_name'] or 'default'
+            if Config.get_vector_backend() == 'local':
+                # In-process index, no network round-trips and usable offline
+                local = Config.get_local_index_settings()
+                self.index = get_local_index(index_name, dimension=self.embedding_dimensions or 1536, **local)
+                namespace = f"local:{index_name}"
+                self.manifest = VectorManifest(namespace=namespace)
+                self.documents = DocumentStore(namespace=namespace)
+                self.index_limiter = None
+            else:
+                self._init_pinecone(api_keys, index_name)
+                self.index_limiter = get_adaptive_limiter('pinecone')
+            self.upsert_writer = UpsertWriter(self.index, limiter=self.index_limiter)
                 
         except Exception as e:
             logger.error(f"Initialization error: {str(e)}")
@@ -99,92 +128,266 @@ class EnhancedRAGProcessor:
             "sources": ["url1", "url2", ...]
         }}
         """
+        self.analysis_model = "gpt-4-1106-preview"  # Use a model that supports JSON output
+        self.analysis_system_prompt = "You are a financial analysis expert. Always respond in valid JSON format."
+        self.analysis_temperature = 0.7
+        # Cached answers are only reused while the prompt and sampling settings are unchanged
+        self.prompt_version = content_hash({
+            "system": self.analysis_system_prompt,
+            "template": self.ANALYSIS_PROMPT_TEMPLATE,
+            "temperature": self.analysis_temperature
+        })[:16]
+        self.context_builder = ContextBuilder(model=self.analysis_model)
+        self.response_cache = get_response_cache()
+        self.answer_cache = get_answer_cache()
+
+    def _init_pinecone(self, api_keys: Dict[str, str], index_name: str):
+        # Initialize Pinecone
+        self.pc = Pinecone(
+            api_key=api_keys['pinecone_api_key'],
+            environment=api_keys['pinecone_env']
+        )
+
+        # Get or create Pinecone index
+        self.manifest = VectorManifest(namespace=index_name)
+        self.documents = DocumentStore(namespace=index_name)
+        try:
+            self.index = self.pc.Index(index_name)
+        except Exception as e:
+            logger.warning(f"Error accessing index: {str(e)}")
+            logger.info("Attempting to create new index...")
+            self.pc.create_index(
+                name=index_name,
+                dimension=self.embedding_dimensions or 1536,  # ada-002 and text-embedding-3-small default
+                metric="cosine"
+            )
+            self.index = self.pc.Index(index_name)
+            # Nothing recorded for the old index exists in the new one
+            self.manifest.clear()
+            self.documents.clear()
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     async def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding with retry logic"""
-        response = self.openai_client.embeddings.create(
-            input=text,
-            model="text-embedding-ada-002"
+        """Get a single embedding through the batching engine"""
+        return (await self.embedder.embed([text]))[0]
+
+    @staticmethod
+    def document_id(result: EnhancedSearchResult) -> str:
+        """Vector ID of the document behind a search result"""
+        return document_vector_id(result.organization, str(result.url), result.snippet)
+
+    async def link_results(self, search_results: List[EnhancedSearchResult]):
+        """Record which questions found which documents"""
+        await asyncio.to_thread(
+            self.manifest.link,
+            [(self.document_id(r), r.question, r.organization) for r in search_results]
         )
-        return response.data[0].embedding
 
-    async def vectorize_content(self, search_results: List[EnhancedSearchResult]) -> List[Dict]:
-        """Enhanced vectorization with metadata"""
-        vectors = []
-        
+    async def vectorize_results(self, search_results: List[EnhancedSearchResult]) -> List[Optional[List[Dict]]]:
+        """Chunk results and vectorize every chunk in batched embedding calls.
+
+        Document vectors depend only on the page and its organization, so
+        results for the same document from different questions share one set
+        of chunk vectors. Returns the chunk vectors of each result in input
+        order, with None for repeats of a document earlier in the list, for
+        results whose content is already in the index unchanged according to
+        the manifest, and for documents with a failed embedding.
+        """
+        await self.link_results(search_results)
+
+        ids, digests = [], []
         for result in search_results:
-            try:
-                # Prepare content with metadata
-                content_with_metadata = f"""
+            ids.append(self.document_id(result))
+            digests.append(content_hash({
+                "model": self.embedder.signature,
+                "chunking": [self.chunker.chunk_tokens, self.chunker.overlap_tokens],
+                "text_storage": "document_store",
+                "organization": result.organization,
+                "content": result.content,
+                "url": canonicalize_url(str(result.url)),
+                "content_type": result.content_type or 'webpage'
+            }))
+
+        unchanged = await asyncio.to_thread(self.manifest.unchanged, list(zip(ids, digests)))
+        first_seen = {}
+        for i, vid in enumerate(ids):
+            first_seen.setdefault(vid, i)
+        changed = [i for i, skip in enumerate(unchanged) if not skip and first_seen[ids[i]] == i]
+        if len(changed) < len(search_results):
+            logger.info(f"Skipping {len(search_results) - len(changed)} unchanged or repeated documents")
+
+        chunks = {i: self.chunker.chunk(search_results[i].content) for i in changed}
+        texts = []
+        for i in changed:
+            result = search_results[i]
+            for chunk in chunks[i]:
+                # Prepare content with stable document metadata only
+                texts.append(f"""
                 Organization: {result.organization}
-                Question Context: {result.question}
                 Content Type: {result.content_type}
-                Timestamp: {result.timestamp}
-                Content: {result.content[:8000]}
-                """
-                
-                embedding = await self._get_embedding(content_with_metadata)
-                
-                # Create unique ID
-                unique_id = f"{hash(result.question + result.organization + str(result.url))}"
-                
-                # Enhanced metadata
+                Section: {chunk.heading or ''}
+                Content: {chunk.text}
+                """)
+
+        embeddings = iter(await self.embedder.embed(texts, raise_on_error=False))
+
+        vectors: List[Optional[List[Dict]]] = [None] * len(search_results)
+        stored_text = []
+        for i in changed:
+            result = search_results[i]
+            document_vectors = []
+            for chunk in chunks[i]:
+                embedding = next(embeddings)
+                # Small filterable metadata only, the text goes to the document store
                 metadata = {
-                    "question": result.question,
+                    "document_id": ids[i],
+                    "chunk_index": chunk.index,
+                    "chunk_count": len(chunks[i]),
+                    "section": (chunk.heading or '')[:200],
                     "organization": result.organization,
-                    "content": result.content[:8000],
                     "url": str(result.url),
                     "timestamp": result.timestamp.isoformat(),
                     "content_type": result.content_type or 'webpage',
-                    "relevance_score": float(result.relevance_score or 0.5)  # Ensure float and non-null
+                    "relevance_score": float(result.relevance_score or 0.5),  # Ensure float and non-null
+                    "content_hash": digests[i]
                 }
-                
-                vectors.append({
-                    "id": unique_id,
+                document_vectors.append({
+                    "id": f"{ids[i]}#{chunk.index}",
                     "values": embedding,
                     "metadata": metadata
                 })
-                
-            except Exception as e:
-                print(f"Error vectorizing content: {str(e)}")
-                continue
-        
+            # A partially embedded document would look complete in the manifest
+            if document_vectors and all(v["values"] is not None for v in document_vectors):
+                vectors[i] = document_vectors
+                stored_text.extend((f"{ids[i]}#{chunk.index}", ids[i], chunk.text) for chunk in chunks[i])
+
+        # Text is stored before its vectors exist so retrieval never finds a vector without text
+        await asyncio.to_thread(self.documents.put_many, stored_text)
         return vectors
 
-    async def query_vector_db(self, question: str, organization: str, top_k: int = 5) -> List[Dict]:
-        """Enhanced vector DB querying"""
-        try:
-            query_text = f"Question about {organization}: {question}"
-            query_embedding = await self._get_embedding(query_text)
-            
-            # Enhanced query with metadata filtering and scoring
-            results = self.index.query(
-                vector=query_embedding,
-                filter={
-                    "organization": {"$eq": organization},
-                    "relevance_score": {"$gte": 0.5}  # Filter for relevant content
-                },
-                top_k=top_k,
-                include_metadata=True
+    async def vectorize_content(self, search_results: List[EnhancedSearchResult]) -> List[Dict]:
+        """Enhanced vectorization with metadata"""
+        return [
+            vector
+            for document_vectors in await self.vectorize_results(search_results) if document_vectors
+            for vector in document_vectors
+        ]
+
+    @staticmethod
+    def _query_filter(organization: str) -> Dict:
+        return {
+            "organization": {"$eq": organization},
+            "relevance_score": {"$gte": MIN_RELEVANCE_SCORE}  # Filter for relevant content
+        }
+
+    def _best_chunks(self, matches: List, top_k: int) -> List:
+        """Best `top_k` matches with at most `max_chunks_per_document` from any one document"""
+        # Sort results by relevance and recency
+        sorted_results = sorted(
+            matches,
+            key=lambda x: (
+                x.score,  # Vector similarity
+                x.metadata.get('relevance_score', 0),  # Content relevance
+                x.metadata.get('timestamp', '2000-01-01')  # Recency
+            ),
+            reverse=True
+        )
+
+        best_chunks, per_document = [], {}
+        for match in sorted_results:
+            doc_id = match.metadata.get('document_id', match.id)
+            if per_document.get(doc_id, 0) >= self.max_chunks_per_document:
+                continue
+            per_document[doc_id] = per_document.get(doc_id, 0) + 1
+            best_chunks.append(match)
+        return best_chunks[:top_k]
+
+    async def _limited(self, fn):
+        """Await `fn()`, under the index provider's adaptive limiter when there is one"""
+        if self.index_limiter is None:
+            return await fn()
+        return await self.index_limiter.call(fn)
+
+    async def _search_index(self, embeddings: List[List[float]], filters: List[Dict], top_k: int) -> List[List]:
+        """Matches for each query embedding; a failed query yields no matches"""
+        if hasattr(self.index, 'query_many'):
+            # Local index: scored together in one pass
+            responses = await asyncio.to_thread(
+                self.index.query_many, embeddings, filters, top_k=top_k, include_metadata=True
             )
-            
-            # Sort results by relevance and recency
-            sorted_results = sorted(
-                results.matches,
-                key=lambda x: (
-                    x.score,  # Vector similarity
-                    x.metadata.get('relevance_score', 0),  # Content relevance
-                    x.metadata.get('timestamp', '2000-01-01')  # Recency
-                ),
-                reverse=True
+            return [response.matches for response in responses]
+
+        # Own pool so the queries are bounded by `max_query_concurrency`, not the default executor size
+        if self._query_executor is None:
+            self._query_executor = ThreadPoolExecutor(
+                max_workers=self.max_query_concurrency, thread_name_prefix='vector-query'
             )
-            
-            return sorted_results
-            
+        loop = asyncio.get_running_loop()
+
+        def search(embedding: List[float], filter: Dict) -> List:
+            return self.index.query(vector=embedding, filter=filter, top_k=top_k, include_metadata=True).matches
+
+        outcomes = await asyncio.gather(
+            *(
+                self._limited(lambda embedding=embedding, filter=filter: loop.run_in_executor(
+                    self._query_executor, search, embedding, filter
+                ))
+                for embedding, filter in zip(embeddings, filters)
+            ),
+            return_exceptions=True
+        )
+        matches = []
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                logger.error(f"Error querying vector database: {str(outcome)}")
+                outcome = []
+            matches.append(outcome)
+        return matches
+
+    async def query_matrix(self, pairs: List[Tuple[str, str]], top_k: int = 5) -> List[List[Dict]]:
+        """Retrieve the best `top_k` chunks for every (question, organization) pair at once.
+
+        All query strings are embedded in one batched call and the vector
+        queries run concurrently, up to `max_query_concurrency` at a time (or
+        together on a local index). Chunk text for every final match is then
+        fetched in a single document store lookup. Results follow `pairs`;
+        a pair whose query failed gets an empty list.
+        """
+        if not pairs:
+            return []
+        try:
+            query_texts = [f"Question about {organization}: {question}" for question, organization in pairs]
+            embeddings = await self.embedder.embed(query_texts)
+            filters = [self._query_filter(organization) for _, organization in pairs]
+            # Extra matches leave room for the per-document cap
+            matches = await self._search_index(embeddings, filters, top_k * self.max_chunks_per_document)
+            best = [self._best_chunks(pair_matches, top_k) for pair_matches in matches]
+
+            # Fetch text for the final matches only; older vectors still carry it in metadata
+            texts = await asyncio.to_thread(
+                self.documents.get_many, [match.id for chunks in best for match in chunks]
+            )
+            results = []
+            for chunks in best:
+                with_text = []
+                for match in chunks:
+                    if match.id in texts:
+                        match.metadata['content'] = texts[match.id]
+                    if match.metadata.get('content'):
+                        with_text.append(match)
+                results.append(with_text)
+            return results
+
         except Exception as e:
             print(f"Error querying vector database: {str(e)}")
-            return []
+            return [[] for _ in pairs]
+
+    async def query_vector_db(self, question: str, organization: str, top_k: int = 5) -> List[Dict]:
+        """Enhanced vector DB querying, returning the best `top_k` chunks.
+
+        At most `max_chunks_per_document` chunks come from any one document so
+        a single long page cannot crowd out the other sources.
+        """
+        return (await self.query_matrix([(question, organization)], top_k))[0]
 
     async def process_with_llm(
         self,
@@ -192,15 +395,41 @@ class EnhancedRAGProcessor:
         question: str,
         organization: str
     ) -> Dict:
-        """Enhanced LLM processing"""
+        """Enhanced LLM processing.
+
+        Responses are cached by model, prompt version, question, organization
+        and a fingerprint of each source as it appears in the prompt, so a
+        repeat of the same cell with the same sources skips the completion.
+        """
         try:
-            # Prepare sources with metadata
-            sources_text = "\n\n".join([
-                f"Source {i+1} ({result.metadata.get('content_type', 'unknown')}, "
-                f"{result.metadata.get('timestamp', 'unknown date')}):\n"
-                f"{result.metadata['content']}"
-                for i, result in enumerate(query_results)
-            ])
+            # Prepare sources with metadata, packed into the context token budget
+            headers = [
+                f"({result.metadata.get('content_type', 'unknown')}, "
+                f"{result.metadata.get('timestamp', 'unknown date')}, {result.metadata.get('url', 'unknown url')})"
+                for result in query_results
+            ]
+            packed = self.context_builder.pack(
+                question,
+                organization,
+                [result.metadata['content'] for result in query_results],
+                [count_tokens(f"Source {i+1} {header}:\n", self.analysis_model) for i, header in enumerate(headers)]
+            )
+            sources = [
+                f"Source {i+1} {headers[source.index]}:\n{source.text}"
+                for i, source in enumerate(packed)
+            ]
+            sources_text = "\n\n".join(sources)
+
+            cache_key = ResponseCache.key(
+                self.analysis_model,
+                self.prompt_version,
+                question,
+                organization,
+                [content_hash({"source": source})[:16] for source in sources]
+            )
+            cached = await asyncio.to_thread(self.response_cache.get, cache_key)
+            if cached is not None and self.is_complete_analysis(cached):
+                return cached
             
             # Construct prompt with enhanced template
             prompt = self.ANALYSIS_PROMPT_TEMPLATE.format(
@@ -210,24 +439,30 @@ class EnhancedRAGProcessor:
             )
             
             # Get LLM response with structured output format
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4-1106-preview",  # Use a model that supports JSON output
+            response = await self.llm_scheduler.complete(
+                self.async_openai_client,
+                model=self.analysis_model,
                 messages=[
-                    {"role": "system", "content": "You are a financial analysis expert. Always respond in valid JSON format."},
+                    {"role": "system", "content": self.analysis_system_prompt},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.7,
+                temperature=self.analysis_temperature,
                 response_format={"type": "json_object"}  # This will work with gpt-4-1106-preview
             )
             
             # Parse the response
             try:
                 result = json.loads(response.choices[0].message.content)
+                # An answer missing fields fails every row built from it, so only complete ones are cached
+                if self.is_complete_analysis(result):
+                    await asyncio.to_thread(self.response_cache.put, cache_key, self.analysis_model, result)
+                else:
+                    logger.warning(f"Incomplete LLM answer for {organization} - {question}, not caching it")
                 return result
             except json.JSONDecodeError:
                 # Fallback for non-JSON responses
                 return {
-                    "answer": "Error: Invalid response format",
+                    "answer": self.INVALID_RESPONSE_ANSWER,
                     "key_findings": [],
                     "metrics": {},
                     "confidence_score": 0.0,
@@ -243,6 +478,129 @@ class EnhancedRAGProcessor:
             print(f"Error processing with LLM: {str(e)}")
             raise
 
+    async def upsert_vectors(self, vectors: List[Dict]):
+        """Upsert vectors in parallel batches and record fully written documents in the manifest"""
+        if not vectors:
+            return
+        report = await self.upsert_writer.write(vectors)
+        failed = set(report.failed_ids)
+        failed_documents = {v["metadata"]["document_id"] for v in vectors if v["id"] in failed}
+        await self._record_documents([v for v in vectors if v["metadata"]["document_id"] not in failed_documents])
+        if failed:
+            raise RuntimeError(f"Failed to upsert {len(failed)} vectors of {len(failed_documents)} documents")
+
+    async def _record_documents(self, vectors: List[Dict]):
+        """Delete chunks left over from older versions of the upserted documents and record the new ones"""
+        if not vectors:
+            return
+        documents = {
+            vector["metadata"]["document_id"]: (vector["metadata"]["content_hash"], vector["metadata"]["chunk_count"])
+            for vector in vectors
+        }
+        previous = await asyncio.to_thread(self.manifest.chunk_counts, list(documents))
+        stale_ids = []
+        for doc_id, old_count in previous.items():
+            if old_count is None:
+                stale_ids.append(doc_id)
+            else:
+                stale_ids.extend(f"{doc_id}#{i}" for i in range(documents[doc_id][1], old_count))
+        if stale_ids:
+            await self._limited(lambda: asyncio.to_thread(self.index.delete, ids=stale_ids))
+            await asyncio.to_thread(self.documents.delete, stale_ids)
+        await asyncio.to_thread(
+            self.manifest.record,
+            [(doc_id, digest, count) for doc_id, (digest, count) in documents.items()]
+        )
+
+    @staticmethod
+    def build_row(question: str, organization: str, processed_result: Dict) -> Dict:
+        """Flatten an LLM analysis into a result matrix row"""
+        return {
+            'Question': question,
+            'Organization': organization,
+            'Answer': processed_result['answer'],
+            'Key Findings': '; '.join(processed_result['key_findings']),
+            'Metrics': json.dumps(processed_result['metrics']),
+            'Confidence': processed_result['confidence_score'],
+            'Source Quality': processed_result['reliability_assessment']['source_quality'],
+            'Data Recency': processed_result['reliability_assessment']['data_recency'],
+            'Data Completeness': processed_result['reliability_assessment']['data_completeness'],
+            'Sources': '; '.join(processed_result['sources'])
+        }
+
+    @classmethod
+    def is_complete_analysis(cls, processed_result: Any) -> bool:
+        """Whether a parsed LLM answer has every field a result row is built from"""
+        try:
+            cls.build_row('', '', processed_result)
+            return True
+        except (KeyError, TypeError, AttributeError):
+            return False
+
+    @classmethod
+    def is_valid_answer(cls, processed_result: Any) -> bool:
+        """Whether an analysis is a complete LLM answer rather than the invalid-response fallback"""
+        return cls.is_complete_analysis(processed_result) and processed_result['answer'] != cls.INVALID_RESPONSE_ANSWER
+
+    @staticmethod
+    def error_row(question: str, organization: str, error: Exception) -> Dict:
+        """Result matrix row describing a failed cell"""
+        return {
+            'Question': question,
+            'Organization': organization,
+            'Answer': f"Error: {str(error)}",
+            'Key Findings': '',
+            'Metrics': '{}',
+            'Confidence': 0.0,
+            'Source Quality': 0.0,
+            'Data Recency': 'unknown',
+            'Data Completeness': 0.0,
+            'Sources': ''
+        }
+
+    async def cached_answers(self, pairs: List[Tuple[str, str]]) -> List[Optional[Dict]]:
+        """Stored rows answering a paraphrase of each (question, organization) pair, or None.
+
+        Questions are embedded in one batched call; a hit is relabelled with the
+        question as asked.
+        """
+        if not pairs:
+            return []
+        try:
+            questions = list(dict.fromkeys(question for question, _ in pairs))
+            embeddings = dict(zip(questions, await self.embedder.embed(questions)))
+
+            def lookup() -> List[Optional[Dict]]:
+                rows = []
+                for question, organization in pairs:
+                    match = self.answer_cache.lookup(
+                        organization, question, embeddings[question], self.embedder.signature
+                    )
+                    if match is None:
+                        rows.append(None)
+                        continue
+                    logger.info(
+                        f"Answer cache hit for {organization} - {question!r} "
+                        f"via {match.question!r} (similarity {match.similarity:.3f})"
+                    )
+                    rows.append({**match.row, 'Question': question, 'Organization': organization})
+                return rows
+
+            return await asyncio.to_thread(lookup)
+        except Exception as e:
+            logger.warning(f"Answer cache lookup failed: {str(e)}")
+            return [None] * len(pairs)
+
+    async def remember_answer(self, question: str, organization: str, row: Dict):
+        """Store the row of a valid answer so paraphrases of the question can reuse it"""
+        try:
+            embedding = (await self.embedder.embed([question]))[0]
+            await asyncio.to_thread(
+                self.answer_cache.store, organization, question, embedding, self.embedder.signature, row
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cache answer: {str(e)}")
+
     async def process_data_matrix(
         self,
         questions: List[str],
@@ -251,59 +609,48 @@ class EnhancedRAGProcessor:
     ) -> pd.DataFrame:
         """Enhanced matrix processing"""
         try:
+            # Cells already answered for a paraphrase of the question need no retrieval or LLM call
+            all_pairs = [(question, org) for question in questions for org in organizations]
+            cached = await self.cached_answers(all_pairs)
+            pairs = [pair for pair, row in zip(all_pairs, cached) if row is None]
+            if not pairs:
+                return pd.DataFrame(cached)
+
             # Vectorize and store results
             vectors = await self.vectorize_content(search_results)
-            if vectors:
-                self.index.upsert(vectors=vectors)
+            await self.upsert_vectors(vectors)
             
-            # Process each pair with enhanced error handling
-            results = []
-            for question in questions:
-                for org in organizations:
-                    try:
-                        # Query vector DB
-                        relevant_content = await self.query_vector_db(question, org)
-                        
-                        if not relevant_content:
-                            raise ValueError(f"No relevant content found for {org} - {question}")
-                        
-                        # Process with LLM
-                        processed_result = await self.process_with_llm(
-                            relevant_content,
-                            question,
-                            org
-                        )
-                        
-                        # Create detailed row
-                        row = {
-                            'Question': question,
-                            'Organization': org,
-                            'Answer': processed_result['answer'],
-                            'Key Findings': '; '.join(processed_result['key_findings']),
-                            'Metrics': json.dumps(processed_result['metrics']),
-                            'Confidence': processed_result['confidence_score'],
-                            'Source Quality': processed_result['reliability_assessment']['source_quality'],
-                            'Data Recency': processed_result['reliability_assessment']['data_recency'],
-                            'Data Completeness': processed_result['reliability_assessment']['data_completeness'],
-                            'Sources': '; '.join(processed_result['sources'])
-                        }
-                        
-                        results.append(row)
-                        
-                    except Exception as e:
-                        # Add error row with details
-                        results.append({
-                            'Question': question,
-                            'Organization': org,
-                            'Answer': f"Error: {str(e)}",
-                            'Key Findings': '',
-                            'Metrics': '{}',
-                            'Confidence': 0.0,
-                            'Source Quality': 0.0,
-                            'Data Recency': 'unknown',
-                            'Data Completeness': 0.0,
-                            'Sources': ''
-                        })
+            # Retrieve context for every pair in one batched step
+            contexts = await self.query_matrix(pairs)
+
+            # Run the LLM for every pair at once; the scheduler keeps within rate limits
+            async def analyze(question: str, org: str, relevant_content: List) -> Dict:
+                try:
+                    if not relevant_content:
+                        raise ValueError(f"No relevant content found for {org} - {question}")
+                    
+                    # Process with LLM
+                    processed_result = await self.process_with_llm(
+                        relevant_content,
+                        question,
+                        org
+                    )
+                    
+                    # Create detailed row
+                    row = self.build_row(question, org, processed_result)
+                    if self.is_valid_answer(processed_result):
+                        await self.remember_answer(question, org, row)
+                    return row
+                    
+                except Exception as e:
+                    # Add error row with details
+                    return self.error_row(question, org, e)
+
+            answered = iter(await asyncio.gather(*(
+                analyze(question, org, relevant_content)
+                for (question, org), relevant_content in zip(pairs, contexts)
+            )))
+            results = [row if row is not None else next(answered) for row in cached]
             
             return pd.DataFrame(results)
             
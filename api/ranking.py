@@ -0,0 +1,126 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from cache import QUERY_STOPWORDS
+from schemas import ContentType
+
+# Minimum relevance for a page to be fetched and later retrieved for the LLM
+MIN_RELEVANCE_SCORE = 0.4
+
+
+@dataclass
+class SearchCandidate:
+    url: str
+    title: str = ''
+    snippet: str = ''
+    score: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data) -> 'SearchCandidate':
+        # Older SERP cache entries hold bare URLs
+        if isinstance(data, str):
+            return cls(url=data)
+        return cls(url=data['url'], title=data.get('title', ''), snippet=data.get('snippet', ''))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {'url': self.url, 'title': self.title, 'snippet': self.snippet}
+
+    @property
+    def text(self) -> str:
+        return f"{self.title}. {self.snippet}".strip(' .')
+
+
+class CandidateRanker:
+    """Cheap pre-fetch ranking of search results from their title, snippet and URL.
+
+    The score is a weighted sum of question-term overlap with the title and
+    snippet, a mention of the organization, a domain prior, a content-type prior
+    and whether the snippet carries figures. Only the best `max_fetch` candidates
+    scoring at least `min_score` are worth downloading.
+    """
+
+    WEIGHTS = {
+        'terms': 0.45,
+        'organization': 0.2,
+        'domain': 0.15,
+        'content_type': 0.1,
+        'figures': 0.1,
+    }
+
+    PRIORITY_DOMAINS = ['ir.', 'investors.', 'investor.', 'sec.gov', 'reuters.com',
+                        'seekingalpha.com', 'finance.yahoo.com', 'cnbc.com']
+
+    CONTENT_TYPE_PRIORS = {
+        ContentType.REGULATORY_FILING: 1.0,
+        ContentType.FINANCIAL_REPORT: 1.0,
+        ContentType.PRESS_RELEASE: 0.8,
+        ContentType.NEWS_ARTICLE: 0.7,
+        ContentType.COMPANY_WEBSITE: 0.6,
+        ContentType.OTHER: 0.3,
+    }
+
+    ORGANIZATION_SUFFIXES = {'inc', 'corp', 'corporation', 'co', 'company', 'ltd', 'llc', 'plc', 'group'}
+
+    def __init__(self, min_score: float = MIN_RELEVANCE_SCORE, max_fetch: int = 5):
+        self.min_score = min_score
+        self.max_fetch = max_fetch
+
+    @staticmethod
+    def _terms(text: str) -> List[str]:
+        return [t for t in re.findall(r'\w+', text.lower()) if t not in QUERY_STOPWORDS and len(t) > 1]
+
+    def _organization_terms(self, organization: str) -> List[str]:
+        return [t for t in self._terms(organization) if t not in self.ORGANIZATION_SUFFIXES]
+
+    def score(
+        self,
+        candidate: SearchCandidate,
+        question: str,
+        organization: str,
+        content_type: ContentType = ContentType.OTHER
+    ) -> float:
+        text = candidate.text.lower()
+        text_terms = set(self._terms(text))
+        host = (urlparse(candidate.url).hostname or '').lower()
+
+        question_terms = set(self._terms(question))
+        term_score = len(question_terms & text_terms) / len(question_terms) if question_terms else 0.0
+
+        org_terms = self._organization_terms(organization)
+        org_score = 0.0
+        if org_terms:
+            in_text = sum(t in text_terms for t in org_terms) / len(org_terms)
+            in_host = 1.0 if any(t in host for t in org_terms) else 0.0
+            org_score = max(in_text, in_host)
+
+        domain_score = 1.0 if any(domain in candidate.url.lower() for domain in self.PRIORITY_DOMAINS) else 0.0
+        type_score = self.CONTENT_TYPE_PRIORS.get(content_type, self.CONTENT_TYPE_PRIORS[ContentType.OTHER])
+        figures_score = 1.0 if re.search(r'[$%€£]|\d+(?:\.\d+)?\s*(?:billion|million|bn|m)\b|\b(?:19|20)\d{2}\b', text) else 0.0
+
+        return round(
+            self.WEIGHTS['terms'] * term_score
+            + self.WEIGHTS['organization'] * org_score
+            + self.WEIGHTS['domain'] * domain_score
+            + self.WEIGHTS['content_type'] * type_score
+            + self.WEIGHTS['figures'] * figures_score,
+            4
+        )
+
+    def rank(
+        self,
+        candidates: List[SearchCandidate],
+        question: str,
+        organization: str,
+        content_type_for: Optional[Callable[[str], ContentType]] = None
+    ) -> List[SearchCandidate]:
+        """Score every candidate and return them best first"""
+        for candidate in candidates:
+            content_type = content_type_for(candidate.url) if content_type_for else ContentType.OTHER
+            candidate.score = self.score(candidate, question, organization, content_type)
+        return sorted(candidates, key=lambda c: c.score, reverse=True)
+
+    def select(self, ranked: List[SearchCandidate]) -> List[SearchCandidate]:
+        """Pick the candidates worth fetching from a ranked list"""
+        return [c for c in ranked if c.score >= self.min_score][:self.max_fetch]
@@ -0,0 +1,505 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until `tokens` are available and take them"""
+        # Created lazily so the lock binds to the loop that actually uses it
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def refund(self, tokens: float):
+        """Return tokens taken for work that turned out smaller than estimated"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+class HostState:
+    """Scheduling state for a single host"""
+
+    def __init__(self, rate: float, burst: float, max_concurrent: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrent = max_concurrent
+        self.semaphore = None
+        self.backoff_until = 0.0
+        self.consecutive_throttles = 0
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self.semaphore
+
+
+class HostScheduler:
+    """Per-host request scheduler.
+
+    Every host gets its own token bucket, concurrency cap and backoff state, so
+    requests to different hosts proceed in parallel while each individual host
+    still sees a polite request rate.
+    """
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 2,
+        max_concurrent_per_host: int = 2,
+        base_backoff: float = 5.0,
+        max_backoff: float = 60.0,
+        host_overrides: Optional[Dict[str, Dict]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent_per_host = max_concurrent_per_host
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        # Per-host settings, e.g. {"google.com": {"rate": 1/3, "burst": 1, "max_concurrent": 1}}
+        self.host_overrides = host_overrides or {}
+        self.hosts: Dict[str, HostState] = {}
+
+    @staticmethod
+    def host_for(url: str) -> str:
+        """Normalize a URL to the host key used for scheduling"""
+        host = (urlparse(url).hostname or '').lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        return host
+
+    def _settings_for(self, host: str) -> Dict:
+        # Match the host itself or any parent domain listed in the overrides
+        for domain, settings in self.host_overrides.items():
+            if host == domain or host.endswith('.' + domain):
+                return settings
+        return {}
+
+    def _state(self, host: str) -> HostState:
+        state = self.hosts.get(host)
+        if state is None:
+            settings = self._settings_for(host)
+            state = HostState(
+                rate=settings.get('rate', self.rate),
+                burst=settings.get('burst', self.burst),
+                max_concurrent=settings.get('max_concurrent', self.max_concurrent_per_host)
+            )
+            self.hosts[host] = state
+        return state
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Hold a request slot for the host of `url` for the duration of the block"""
+        state = self._state(self.host_for(url))
+        async with state.get_semaphore():
+            # Honor any backoff set while we were queued
+            delay = state.backoff_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await state.bucket.acquire()
+            yield
+
+    def record_success(self, url: str):
+        """Reset the backoff of a host after a successful response"""
+        state = self._state(self.host_for(url))
+        state.consecutive_throttles = 0
+
+    def record_throttled(self, url: str, retry_after: Optional[float] = None):
+        """Back off a host after a 403/429, honoring Retry-After when given"""
+        host = self.host_for(url)
+        state = self._state(host)
+        state.consecutive_throttles += 1
+        if retry_after is None:
+            retry_after = self.base_backoff * (2 ** (state.consecutive_throttles - 1))
+        delay = min(self.max_backoff, retry_after)
+        state.backoff_until = max(state.backoff_until, time.monotonic() + delay)
+        self.logger.info(f"Backing off {host} for {delay:.1f}s")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class CircuitState(str, Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class HostCircuit:
+    """Failure record and breaker state for a single host"""
+
+    def __init__(self):
+        self.state = CircuitState.CLOSED
+        self.failures: List[float] = []
+        self.opened_until = 0.0
+        self.trips = 0
+        self.probe_started = 0.0
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker.
+
+    A host that keeps failing (403, 429, timeouts) within `failure_window` opens
+    its circuit and requests to it are refused immediately. Once the open period
+    expires the circuit goes half-open and a single probe request is let through:
+    success closes it, failure re-opens it for twice as long, up to `max_open_time`.
+    Hosts in `blocked_hosts` stay open permanently.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        failure_window: float = 600.0,
+        open_time: float = 300.0,
+        max_open_time: float = 3600.0,
+        probe_timeout: float = 60.0,
+        blocked_hosts: Optional[List[str]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.open_time = open_time
+        self.max_open_time = max_open_time
+        self.probe_timeout = probe_timeout
+        self.blocked_hosts = set(blocked_hosts or [])
+        self.circuits: Dict[str, HostCircuit] = {}
+
+    def _is_blocked(self, host: str) -> bool:
+        return any(host == domain or host.endswith('.' + domain) for domain in self.blocked_hosts)
+
+    def block(self, domain: str):
+        """Permanently refuse requests to a domain and its subdomains"""
+        self.blocked_hosts.add(domain)
+
+    def allow(self, url: str) -> bool:
+        """Whether a request to the host of `url` may be attempted now"""
+        host = HostScheduler.host_for(url)
+        if self._is_blocked(host):
+            return False
+        circuit = self.circuits.get(host)
+        if circuit is None or circuit.state == CircuitState.CLOSED:
+            return True
+
+        now = time.monotonic()
+        if circuit.state == CircuitState.OPEN:
+            if now < circuit.opened_until:
+                return False
+            circuit.state = CircuitState.HALF_OPEN
+            circuit.probe_started = 0.0
+
+        # Half-open: let one probe through at a time
+        if circuit.probe_started and now - circuit.probe_started < self.probe_timeout:
+            return False
+        circuit.probe_started = now
+        return True
+
+    def record_success(self, url: str):
+        """Close the circuit of a host and forget its failures"""
+        host = HostScheduler.host_for(url)
+        circuit = self.circuits.pop(host, None)
+        if circuit is not None and circuit.state != CircuitState.CLOSED:
+            self.logger.info(f"Circuit closed for {host}")
+
+    def record_failure(self, url: str):
+        """Record a 403/429/timeout and open the circuit once the host keeps failing"""
+        host = HostScheduler.host_for(url)
+        circuit = self.circuits.setdefault(host, HostCircuit())
+        now = time.monotonic()
+        circuit.failures = [t for t in circuit.failures if now - t < self.failure_window]
+        circuit.failures.append(now)
+
+        if circuit.state == CircuitState.HALF_OPEN or len(circuit.failures) >= self.failure_threshold:
+            open_for = min(self.max_open_time, self.open_time * (2 ** circuit.trips))
+            circuit.trips += 1
+            circuit.state = CircuitState.OPEN
+            circuit.opened_until = now + open_for
+            circuit.failures = []
+            circuit.probe_started = 0.0
+            self.logger.warning(f"Circuit opened for {host} for {open_for:.0f}s")
+
+    def open_hosts(self) -> List[str]:
+        now = time.monotonic()
+        return [
+            host for host, circuit in self.circuits.items()
+            if circuit.state == CircuitState.OPEN and now < circuit.opened_until
+        ]
+
+
+_shared_breaker: Optional[CircuitBreaker] = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """Process-wide circuit breaker, so failure memory outlives a single scraper"""
+    global _shared_breaker
+    if _shared_breaker is None:
+        _shared_breaker = CircuitBreaker()
+    return _shared_breaker
+
+
+class RetryBudget:
+    """Process-wide allowance of retries, proportional to the requests made.
+
+    Every first attempt deposits `ratio` of a retry and every retry withdraws
+    one, with `min_per_second` always available on top. During an outage the
+    deposits stop, so retries stay a small fraction of traffic instead of
+    multiplying the load on a struggling provider.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_balance: float = 100.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self.balance = max_balance
+        self.updated = time.monotonic()
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.balance = min(self.max_balance, self.balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget, if there is one"""
+        with self._lock:
+            now = time.monotonic()
+            self.balance = min(self.max_balance, self.balance + (now - self.updated) * self.min_per_second)
+            self.updated = now
+            if self.balance >= 1.0:
+                self.balance -= 1.0
+                return True
+            self.denied += 1
+            return False
+
+
+class ProviderFailure:
+    """Status and Retry-After of a failed provider call, when it has them"""
+
+    RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(self, status: Optional[int], retry_after: Optional[float], transient: bool):
+        self.status = status
+        self.retry_after = retry_after
+        self.transient = transient
+
+    @classmethod
+    def classify(cls, error: Exception) -> 'ProviderFailure':
+        """Read the status and Retry-After from OpenAI, Pinecone or HTTP client errors"""
+        status = getattr(error, 'status_code', None) or getattr(error, 'status', None)
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+        retry_after = None
+        try:
+            if headers.get('retry-after-ms'):
+                retry_after = max(0.0, float(headers['retry-after-ms']) / 1000)
+            else:
+                retry_after = parse_retry_after(headers.get('retry-after'))
+        except (AttributeError, ValueError):
+            pass
+        if isinstance(status, int):
+            transient = status in cls.RETRYABLE_STATUSES
+        else:
+            status = None
+            name = type(error).__name__
+            transient = isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)) or \
+                'Timeout' in name or 'Connection' in name
+        return cls(status, retry_after, transient)
+
+    @property
+    def overloaded(self) -> bool:
+        """Whether the failure says the provider wants less traffic"""
+        return self.status == 429 or (self.status or 0) >= 500 or (self.status is None and self.transient)
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for calls to one provider endpoint.
+
+    While calls fill it, the limit grows by one for every `limit` successful
+    calls (about one per round of calls) and is multiplied by `decrease_factor` when the provider
+    answers 429/5xx, times out, or, with `latency_tolerance` set, when the
+    smoothed latency climbs past that multiple of the best latency seen.
+    Decreases happen at most once per smoothed latency so a burst of failures
+    from one round cuts the limit once. Retry-After pauses new calls for that
+    long. Failed calls are retried with jittered exponential backoff up to
+    `max_attempts`, each retry paid for from the shared `RetryBudget`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        decrease_factor: float = 0.5,
+        latency_tolerance: Optional[float] = 2.0,
+        max_attempts: int = 4,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0,
+        retry_budget: Optional[RetryBudget] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.retry_budget = retry_budget or RetryBudget()
+
+        self.inflight = 0
+        self.latency: Optional[float] = None  # smoothed seconds per call
+        self.best_latency: Optional[float] = None
+        self.backoff_until = 0.0
+        self.last_decrease = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self._condition = None
+
+    async def _acquire(self):
+        # Created lazily so the condition binds to the loop that actually uses it
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            while self.inflight >= max(1, int(self.limit)):
+                await self._condition.wait()
+            self.inflight += 1
+        # Honor any Retry-After received while we were queued
+        delay = self.backoff_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _release(self):
+        async with self._condition:
+            self.inflight -= 1
+            self._condition.notify_all()
+
+    def _decrease(self, reason: str):
+        now = time.monotonic()
+        if now - self.last_decrease < (self.latency or 1.0):
+            return
+        self.last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        self.logger.info(f"{self.name}: concurrency limit down to {self.limit:.1f} ({reason})")
+
+    def _record_success(self, seconds: float):
+        self.latency = seconds if self.latency is None else 0.8 * self.latency + 0.2 * seconds
+        if self.best_latency is None or self.latency < self.best_latency:
+            self.best_latency = self.latency
+        else:
+            # Let the baseline follow lasting changes in the workload
+            self.best_latency += (self.latency - self.best_latency) * 0.01
+        if self.latency_tolerance and self.latency > self.best_latency * self.latency_tolerance:
+            self._decrease(f"latency {self.latency:.2f}s vs {self.best_latency:.2f}s")
+        elif self.inflight >= int(self.limit):
+            # Only grow a limit that is actually in use
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def _record_failure(self, failure: ProviderFailure):
+        if failure.retry_after is not None:
+            self.backoff_until = max(self.backoff_until, time.monotonic() + failure.retry_after)
+        if failure.overloaded:
+            self.throttled += 1
+            self._decrease(f"status {failure.status}" if failure.status else "timeout")
+
+    def _backoff(self, attempt: int, failure: ProviderFailure) -> float:
+        if failure.retry_after is not None:
+            return failure.retry_after
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn()` within the limit, retrying transient failures while the budget allows"""
+        self.retry_budget.record_request()
+        attempt = 0
+        while True:
+            await self._acquire()
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                failure = ProviderFailure.classify(e)
+                self._record_failure(failure)
+                await self._release()
+                attempt += 1
+                if not failure.transient or attempt >= self.max_attempts or not self.retry_budget.try_spend():
+                    raise
+                self.retries += 1
+                delay = self._backoff(attempt, failure)
+                self.logger.warning(f"{self.name}: attempt {attempt} failed ({str(e)}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.calls += 1
+            self._record_success(time.monotonic() - start)
+            await self._release()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'limit': round(self.limit, 2),
+            'inflight': self.inflight,
+            'latency': self.latency,
+            'calls': self.calls,
+            'throttled': self.throttled,
+            'retries': self.retries,
+            'retries_denied': self.retry_budget.denied,
+        }
+
+
+_shared_retry_budget = RetryBudget()
+_adaptive_limiters: Dict[str, AdaptiveLimiter] = {}
+
+# Completion latency follows output length, so it says nothing about load
+ADAPTIVE_LIMITER_SETTINGS = {
+    'openai-chat': {'initial_limit': 8, 'max_limit': 64, 'latency_tolerance': None},
+    'openai-embeddings': {'initial_limit': 4, 'max_limit': 32},
+    'pinecone': {'initial_limit': 8, 'max_limit': 64},
+}
+
+
+def get_adaptive_limiter(name: str) -> AdaptiveLimiter:
+    """Process-wide limiter per provider endpoint, all drawing on one retry budget"""
+    limiter = _adaptive_limiters.get(name)
+    if limiter is None:
+        limiter = AdaptiveLimiter(name, retry_budget=_shared_retry_budget, **ADAPTIVE_LIMITER_SETTINGS.get(name, {}))
+        _adaptive_limiters[name] = limiter
+    return limiter
+
+
+def adaptive_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: limiter.stats() for name, limiter in _adaptive_limiters.items()}
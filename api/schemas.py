@@ -21,10 +21,12 @@ class SearchResult(BaseModel):
     content_type: ContentType = ContentType.OTHER
     timestamp: datetime = datetime.now()
     relevance_score: float = 0.5
+    snippet: bool = False  # content is the search snippet, not the fetched page
 
 class QueryRequest(BaseModel):
     questions: List[str] = Field(..., min_items=1, max_items=10)
     organizations: List[str] = Field(..., min_items=1, max_items=10)
+    snippet_only: bool = False  # Answer from search snippets without fetching pages
     
     @validator('questions')
     def validate_questions(cls, v):
@@ -38,6 +40,10 @@ class QueryRequest(BaseModel):
             raise ValueError("Organizations cannot be empty strings")
         return [org.strip() for org in v]
 
+class FalseHitReport(BaseModel):
+    question: str
+    organization: str
+
 class AnalysisResult(BaseModel):
     answer: str
     key_findings: List[str]
@@ -1,14 +1,19 @@
 from datetime import datetime
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
-from dataclasses import dataclass
 import logging
 from urllib.parse import quote_plus
 import re
+import codecs
 from fake_useragent import UserAgent
 from schemas import QueryRequest, SearchResult
+from rate_limiter import HostScheduler, get_circuit_breaker, parse_retry_after
+from cache import PageCache, SerpCache
+from html_parsing import ScrapedContent, extract_content, extract_search_results, get_parser_pool
+from dedup import SingleFlight, canonicalize_url
+from ranking import CandidateRanker, SearchCandidate
+from query_planner import QueryPlanner
 import ssl
 from enum import Enum
 
@@ -20,27 +25,70 @@ class ContentType(str, Enum):
     COMPANY_WEBSITE = 'company_website'
     OTHER = 'other'
 
-@dataclass
-class ScrapedContent:
-    url: str
-    title: str
-    content: str
-    snippet: str
+def merge_search_results(result_lists) -> List[Dict[str, str]]:
+    """Union of several searches' results, one entry per canonical URL, in first-seen order"""
+    merged = {}
+    for results in result_lists:
+        for result in results:
+            url = result['url'] if isinstance(result, dict) else result
+            merged.setdefault(canonicalize_url(url), result)
+    return list(merged.values())
 
 class WebScraper:
-    def __init__(self):
+    def __init__(self, snippet_only: bool = False):
         self.ua = UserAgent()
         self.logger = logging.getLogger(__name__)
         self.session = None
         
         # Configure base URLs and parameters
         self.search_base_url = "https://www.google.com/search"
-        self.max_results_per_query = 5
-        self.concurrent_requests = 3  # Limit concurrent requests to avoid rate limiting
+        self.max_results_per_query = 5  # Pages fetched per query after ranking
+        self.max_search_candidates = 10  # Search results considered for ranking
+        self.concurrent_requests = 3  # Concurrent requests allowed per host
+        
+        # Rank search results from their snippets before fetching anything; in
+        # snippet-only mode the snippets themselves are the content
+        self.ranker = CandidateRanker(max_fetch=self.max_results_per_query)
+        self.snippet_only = snippet_only
+        
+        # Group related questions per organization into a few broader searches
+        self.planner = QueryPlanner(self._construct_search_query, max_searches_per_org=3)
+        
+        # Response body limits
+        self.max_body_bytes = 2 * 1024 * 1024  # Stop reading a body after this many bytes
+        self.max_content_length = 16 * 1024 * 1024  # Skip responses declaring more than this
+        self.read_chunk_size = 64 * 1024
+        self.allowed_content_types = (
+            'text/html', 'application/xhtml+xml', 'text/plain', 'application/xml', 'text/xml'
+        )
         
         # Rate limiting parameters
-        self.request_delay = 3  # Delay between requests in seconds
-        self.last_request_time = 0
+        self.request_delay = 3  # Delay between requests to the search engine in seconds
+        self.host_scheduler = HostScheduler(
+            rate=1.0,
+            burst=2,
+            max_concurrent_per_host=self.concurrent_requests,
+            host_overrides={
+                'google.com': {'rate': 1 / self.request_delay, 'burst': 1, 'max_concurrent': 1}
+            }
+        )
+        
+        # Hosts that keep failing are refused immediately; sites that typically
+        # block scraping start out refused
+        self.blocked_domains = ['bloomberg.com', 'ft.com', 'wsj.com']
+        self.circuit_breaker = get_circuit_breaker()
+        for domain in self.blocked_domains:
+            self.circuit_breaker.block(domain)
+        
+        # Persistent page and search-result caches shared across requests
+        self.page_cache = PageCache()
+        self.serp_cache = SerpCache(namespace='google')
+        
+        # HTML parsing runs in a shared process pool, off the event loop
+        self.parser_pool = get_parser_pool()
+        
+        # Each canonical URL is fetched and extracted once per scraper run
+        self.page_flights = SingleFlight()
         
     async def __aenter__(self):
         """Context manager entry for async with"""
@@ -90,8 +138,15 @@ class WebScraper:
         else:
             return ContentType.OTHER
 
-    async def _fetch_url(self, url: str) -> Optional[str]:
-        """Enhanced fetch with retry logic"""
+    async def _fetch_url(self, url: str, use_cache: bool = True) -> Optional[str]:
+        """Enhanced fetch with retry logic and on-disk page caching"""
+        # Known-bad hosts fail fast instead of waiting on timeouts
+        if not self.circuit_breaker.allow(url):
+            if use_cache:
+                cached = await asyncio.to_thread(self.page_cache.get, url)
+                return cached.body if cached else None
+            return None
+            
         if not self.session:
             self.session = aiohttp.ClientSession()
             
@@ -105,209 +160,292 @@ class WebScraper:
             'Upgrade-Insecure-Requests': '1'
         }
         
-        # Sites that typically block scraping
-        blocked_domains = ['bloomberg.com', 'ft.com', 'wsj.com']
-        if any(domain in url for domain in blocked_domains):
-            return None
+        # Serve fresh pages from cache, revalidate stale ones with a conditional request
+        cached = None
+        if use_cache:
+            cached = await asyncio.to_thread(self.page_cache.get, url)
+            if cached and cached.is_fresh:
+                return cached.body
+            if cached:
+                headers.update(cached.revalidation_headers())
             
         retries = 3
         for attempt in range(retries):
+            # Stop retrying once the host's circuit has opened
+            if attempt > 0 and not self.circuit_breaker.allow(url):
+                break
             try:
-                # Implement rate limiting
-                current_time = asyncio.get_event_loop().time()
-                time_since_last = current_time - self.last_request_time
-                if time_since_last < self.request_delay:
-                    await asyncio.sleep(self.request_delay - time_since_last)
-                
                 timeout = aiohttp.ClientTimeout(total=20)
-                async with self.session.get(
+                # Rate limiting is per host, so fetches to different domains run in parallel
+                async with self.host_scheduler.slot(url), self.session.get(
                     url, 
                     headers=headers, 
                     timeout=timeout,
                     ssl=False,
                     allow_redirects=True
                 ) as response:
-                    self.last_request_time = asyncio.get_event_loop().time()
                     if response.status == 200:
-                        return await response.text()
+                        self.host_scheduler.record_success(url)
+                        self.circuit_breaker.record_success(url)
+                        body = await self._read_body(response, url)
+                        if body is None:
+                            return None
+                        if use_cache:
+                            await asyncio.to_thread(
+                                self.page_cache.put,
+                                url,
+                                body,
+                                response.headers,
+                                self._determine_content_type(url)
+                            )
+                        return body
+                    elif response.status == 304 and cached:
+                        self.host_scheduler.record_success(url)
+                        self.circuit_breaker.record_success(url)
+                        await asyncio.to_thread(self.page_cache.touch, url, response.headers)
+                        return cached.body
                     elif response.status == 403 or response.status == 429:
-                        # If rate limited, wait longer before retry
-                        await asyncio.sleep(5 * (attempt + 1))
+                        # If rate limited, back off this host only before retry
+                        self.circuit_breaker.record_failure(url)
+                        self.host_scheduler.record_throttled(
+                            url, parse_retry_after(response.headers.get('Retry-After'))
+                        )
                         continue
                     else:
                         self.logger.warning(f"Failed to fetch {url}, status: {response.status}")
                         return None
                         
+            except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+                self.logger.error(f"Attempt {attempt + 1} failed for {url}: {str(e) or type(e).__name__}")
+                self.circuit_breaker.record_failure(url)
+                if attempt < retries - 1:
+                    await asyncio.sleep(2 * (attempt + 1))
+                continue
             except Exception as e:
                 self.logger.error(f"Attempt {attempt + 1} failed for {url}: {str(e)}")
                 if attempt < retries - 1:
                     await asyncio.sleep(2 * (attempt + 1))
                 continue
-                
+        
+        # Fall back to a stale copy rather than nothing
+        if cached:
+            self.logger.info(f"Serving stale cached copy of {url}")
+            return cached.body
         return None
 
-    def _extract_search_results(self, html_content: str) -> List[str]:
-        """Extract URLs with better filtering"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        urls = []
+    async def _read_body(self, response: aiohttp.ClientResponse, url: str) -> Optional[str]:
+        """Stream a response body up to the byte budget, skipping binary and oversized responses"""
+        # aiohttp reports a missing header as application/octet-stream; keep those pages
+        if response.headers.get('Content-Type') and response.content_type not in self.allowed_content_types:
+            self.logger.info(f"Skipping {url}: unsupported content type {response.content_type}")
+            return None
+        if response.content_length and response.content_length > self.max_content_length:
+            self.logger.info(f"Skipping {url}: declared size {response.content_length} bytes")
+            return None
         
-        # Find all search result divs
-        for result in soup.find_all('div', class_='g'):
-            try:
-                # Get the link
-                link = result.find('a', href=True)
-                if not link or not link['href'].startswith('http'):
-                    continue
-                    
-                url = link['href']
-                
-                # Skip unwanted domains
-                skip_domains = ['google.com', 'youtube.com', 'facebook.com', 'twitter.com']
-                if any(domain in url for domain in skip_domains):
-                    continue
-                    
-                # Prioritize financial and news websites
-                priority_domains = ['ir.', 'investors.', 'reuters.com', 'seekingalpha.com', 'finance.yahoo.com']
-                if any(domain in url for domain in priority_domains):
-                    urls.insert(0, url)
-                else:
-                    urls.append(url)
-                    
-            except Exception as e:
-                self.logger.error(f"Error extracting URL: {str(e)}")
-                continue
-                
-        return urls[:self.max_results_per_query]
+        chunks = []
+        size = 0
+        async for chunk in response.content.iter_chunked(self.read_chunk_size):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_body_bytes:
+                self.logger.debug(f"Truncated {url} at {size} bytes")
+                break
+        raw = b''.join(chunks)[:self.max_body_bytes]
+        
+        return raw.decode(self._detect_charset(response, raw), errors='replace')
+
+    @staticmethod
+    def _detect_charset(response: aiohttp.ClientResponse, raw: bytes) -> str:
+        """Charset from the headers or a <meta> tag, instead of slow statistical detection"""
+        charset = response.charset
+        if not charset:
+            match = re.search(rb'<meta[^>]+charset=["\']?([\w-]+)', raw[:4096], re.IGNORECASE)
+            charset = match.group(1).decode('ascii') if match else 'utf-8'
+        try:
+            codecs.lookup(charset)
+            return charset
+        except LookupError:
+            return 'utf-8'
+
+    def _extract_search_results(self, html_content: str) -> List[Dict[str, str]]:
+        """Extract result URLs with their titles and snippets"""
+        return extract_search_results(html_content, self.parser_pool.parser, self.max_search_candidates)
 
     def _extract_content(self, html_content: str, url: str) -> Optional[ScrapedContent]:
         """Enhanced content extraction"""
-        try:
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            # Remove unwanted elements
-            for element in soup.find_all(['script', 'style', 'nav', 'footer', 'header', 'aside']):
-                element.decompose()
-                
-            # First try to find article or main content
-            main_content = soup.find('article') or soup.find('main')
-            if main_content:
-                paragraphs = main_content.find_all(['p', 'h1', 'h2', 'h3', 'table'])
-            else:
-                paragraphs = soup.find_all(['p', 'h1', 'h2', 'h3', 'table'])
-            
-            # Extract title
-            title = soup.title.string if soup.title else ''
-            
-            # Process paragraphs
-            content_parts = []
-            for p in paragraphs:
-                text = p.get_text(strip=True)
-                # Keep only substantial paragraphs
-                if len(text) > 30 and not any(skip in text.lower() for skip in ['cookie', 'subscribe', 'privacy policy']):
-                    content_parts.append(text)
-            
-            if not content_parts:
-                return None
-            
-            # Join content with proper spacing
-            content = ' '.join(content_parts)
-            
-            # Create a focused snippet
-            snippet = ' '.join(content_parts[:3])  # First three substantial paragraphs
-            
-            return ScrapedContent(
-                url=url,
-                title=title,
-                content=content[:8000],  # Limit content length
-                snippet=snippet[:500]  # Limit snippet length
-            )
-            
-        except Exception as e:
-            self.logger.error(f"Error extracting content from {url}: {str(e)}")
-            return None
+        return extract_content(html_content, url, self.parser_pool.parser)
 
-    async def _scrape_single_query(self, question: str, organization: str) -> List[SearchResult]:
-        """Scrape results for a single question-organization pair with enhanced error handling"""
-        try:
-            query = self._construct_search_query(question, organization)
+    async def search_raw(self, query: str) -> List[Dict[str, str]]:
+        """Run a search query, returning unranked results with titles and snippets"""
+        # Near-identical queries share one search through the normalized SERP cache
+        raw_results = await asyncio.to_thread(self.serp_cache.get, query)
+        if raw_results is None:
             search_url = f"{self.search_base_url}?q={query}"
-            
-            # Fetch search results
-            search_html = await self._fetch_url(search_url)
+            search_html = await self._fetch_url(search_url, use_cache=False)
             if not search_html:
                 self.logger.warning(f"No search results found for query: {query}")
                 return []
             
-            urls = self._extract_search_results(search_html)
-            results = []
-            
-            # Process URLs with enhanced error handling
-            async def process_url(url):
-                try:
-                    html_content = await self._fetch_url(url)
-                    if html_content:
-                        content = self._extract_content(html_content, url)
-                        if content:
-                            content_type = self._determine_content_type(url)
-                            return SearchResult(
-                                question=question,
-                                organization=organization,
-                                content=content.content,
-                                url=url,
-                                timestamp=datetime.now(),
-                                content_type=content_type,  # Using proper enum value
-                                relevance_score=0.5
-                            )
-                except Exception as e:
-                    self.logger.error(f"Error processing URL {url}: {str(e)}")
+            raw_results = await self.parser_pool.extract_search_results(
+                search_html, self.max_search_candidates
+            )
+            if raw_results:
+                await asyncio.to_thread(self.serp_cache.put, query, raw_results)
+        return raw_results
+
+    def rank_candidates(
+        self,
+        raw_results: List[Dict[str, str]],
+        question: str,
+        organization: str
+    ) -> List[SearchCandidate]:
+        """Score search results against one question and keep those worth fetching, best first"""
+        candidates = [SearchCandidate.from_dict(r) for r in raw_results]
+        ranked = self.ranker.rank(candidates, question, organization, self._determine_content_type)
+        return self.ranker.select(ranked)
+
+    async def search_candidates(self, question: str, organization: str) -> List[SearchCandidate]:
+        """Search for a single question-organization pair"""
+        query = self._construct_search_query(question, organization)
+        return self.rank_candidates(await self.search_raw(query), question, organization)
+
+    async def search_organization(self, questions: List[str], organization: str) -> Dict[str, List[SearchCandidate]]:
+        """Run the planned searches for an organization and rank the pooled results per question"""
+        plans = self.planner.plan_organization(questions, organization)
+        searches = await asyncio.gather(
+            *(self.search_raw(plan.query) for plan in plans), return_exceptions=True
+        )
+        pool = merge_search_results(r for r in searches if isinstance(r, list))
+        return {
+            question: self.rank_candidates(pool, question, organization)
+            for question in questions
+        }
+
+    async def extract_page(self, url: str, html_content: str) -> Optional[ScrapedContent]:
+        """Extract the main content of a fetched page off the event loop"""
+        return await self.parser_pool.extract_content(html_content, url)
+
+    async def fetch_content(self, url: str) -> Optional[ScrapedContent]:
+        """Fetch and extract a page, sharing one download across every caller of the same URL"""
+        async def fetch_and_extract():
+            html_content = await self._fetch_url(url)
+            if not html_content:
                 return None
-            
-            # Process URLs with concurrent limiting
-            tasks = []
-            for url in urls:
-                if len(tasks) >= self.concurrent_requests:
-                    # Wait for some tasks to complete before adding more
-                    completed = await asyncio.gather(*tasks, return_exceptions=True)
-                    results.extend([r for r in completed if r and not isinstance(r, Exception)])
-                    tasks = []
-                tasks.append(asyncio.create_task(process_url(url)))
-            
-            if tasks:
-                completed = await asyncio.gather(*tasks, return_exceptions=True)
-                results.extend([r for r in completed if r and not isinstance(r, Exception)])
-            
-            return results
+            return await self.extract_page(url, html_content)
+        
+        return await self.page_flights.do(canonicalize_url(url), fetch_and_extract)
+
+    def build_result(
+        self,
+        question: str,
+        organization: str,
+        url: str,
+        content: ScrapedContent,
+        relevance_score: float
+    ) -> SearchResult:
+        """Wrap extracted page content in a SearchResult for a question-organization pair"""
+        return SearchResult(
+            question=question,
+            organization=organization,
+            content=content.content,
+            url=url,
+            timestamp=datetime.now(),
+            content_type=self._determine_content_type(url),  # Using proper enum value
+            relevance_score=relevance_score
+        )
+
+    def build_snippet_result(
+        self,
+        question: str,
+        organization: str,
+        candidate: SearchCandidate
+    ) -> SearchResult:
+        """SearchResult built from a search snippet alone, without fetching the page"""
+        return SearchResult(
+            question=question,
+            organization=organization,
+            content=candidate.text,
+            url=candidate.url,
+            timestamp=datetime.now(),
+            content_type=self._determine_content_type(candidate.url),
+            relevance_score=candidate.score,
+            snippet=True
+        )
+
+    async def _scrape_candidates(
+        self,
+        question: str,
+        organization: str,
+        candidates: List[SearchCandidate]
+    ) -> List[SearchResult]:
+        """Fetch ranked candidates for a question-organization pair with enhanced error handling"""
+        if self.snippet_only:
+            return [self.build_snippet_result(question, organization, c) for c in candidates]
+        results = []
+        
+        # Process URLs with enhanced error handling
+        async def process_candidate(candidate):
+            try:
+                content = await self.fetch_content(candidate.url)
+                if content:
+                    return self.build_result(
+                        question, organization, candidate.url, content, candidate.score
+                    )
+            except Exception as e:
+                self.logger.error(f"Error processing URL {candidate.url}: {str(e)}")
+            return None
+        
+        # Drop variants of the same page, e.g. http/https or tracking parameters
+        unique_candidates = {}
+        for candidate in candidates:
+            unique_candidates.setdefault(canonicalize_url(candidate.url), candidate)
+        
+        # Concurrency is limited per host by the scheduler
+        tasks = [asyncio.create_task(process_candidate(c)) for c in unique_candidates.values()]
+        if tasks:
+            completed = await asyncio.gather(*tasks, return_exceptions=True)
+            results.extend([r for r in completed if r and not isinstance(r, Exception)])
+        
+        return results
+
+    async def _scrape_single_query(self, question: str, organization: str) -> List[SearchResult]:
+        """Scrape results for a single question-organization pair with enhanced error handling"""
+        try:
+            candidates = await self.search_candidates(question, organization)
+            return await self._scrape_candidates(question, organization, candidates)
             
         except Exception as e:
             self.logger.error(f"Error in _scrape_single_query: {str(e)}")
             return []
 
+    async def _scrape_organization(self, questions: List[str], organization: str) -> List[SearchResult]:
+        """Scrape every question about an organization from a shared pool of planned searches"""
+        try:
+            candidates_by_question = await self.search_organization(questions, organization)
+            batches = await asyncio.gather(*(
+                self._scrape_candidates(question, organization, candidates)
+                for question, candidates in candidates_by_question.items()
+            ), return_exceptions=True)
+            return [r for batch in batches if isinstance(batch, list) for r in batch]
+            
+        except Exception as e:
+            self.logger.error(f"Error in _scrape_organization: {str(e)}")
+            return []
+
     async def scrape_matrix(self, questions: List[str], organizations: List[str]) -> List[SearchResult]:
         """Enhanced matrix scraping with proper session handling"""
         try:
             self.session = aiohttp.ClientSession()  # Create session
             all_results = []
             
-            # Process in batches to avoid overwhelming resources
-            batch_size = 4  # Adjust based on your needs
-            for i in range(0, len(questions), batch_size):
-                question_batch = questions[i:i + batch_size]
-                for j in range(0, len(organizations), batch_size):
-                    org_batch = organizations[j:j + batch_size]
-                    
-                    tasks = []
-                    for question in question_batch:
-                        for org in org_batch:
-                            tasks.append(self._scrape_single_query(question, org))
-                    
-                    batch_results = await asyncio.gather(*tasks, return_exceptions=True)
-                    for results in batch_results:
-                        if isinstance(results, list):
-                            all_results.extend(results)
-                    
-                    # Add delay between batches
-                    await asyncio.sleep(self.request_delay)
+            # All organizations run at once; per-host scheduling keeps each site's request rate polite
+            tasks = [self._scrape_organization(questions, org) for org in organizations]
+            for results in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(results, list):
+                    all_results.extend(results)
             
+            self.logger.info(f"SERP cache stats: {self.serp_cache.stats()}")
             return all_results
             
         finally:
@@ -0,0 +1,22 @@
+from context_builder import ContextBuilder
+
+
+def test_sentences_differing_in_a_figure_are_both_kept():
+    builder = ContextBuilder(max_tokens=1000)
+    packed = builder.pack('What was Apple revenue growth?', 'Apple', [
+        'Apple revenue grew 5% in Q1 2024. Analysts had expected less.',
+        'Apple revenue grew 7% in Q1 2024. The figure was restated later.',
+    ])
+    text = ' '.join(source.text for source in packed)
+    assert 'grew 5%' in text and 'grew 7%' in text
+
+
+def test_reordered_sentence_is_kept_and_exact_repeat_dropped():
+    builder = ContextBuilder(max_tokens=1000)
+    packed = builder.pack('Who beat whom?', 'Apple', [
+        'Apple beat Microsoft on revenue. Shares rose after the call.',
+        'Microsoft beat Apple on revenue. Apple beat  Microsoft on revenue!',
+    ])
+    text = ' '.join(source.text for source in packed)
+    assert 'Microsoft beat Apple on revenue.' in text
+    assert text.lower().count('apple beat microsoft') == 1
@@ -0,0 +1,76 @@
+import asyncio
+
+from pipeline import DocumentState, Job, MatrixPipeline, PairState
+
+
+class FakeRAG:
+    """Answers every cell except those asking `failing_question`"""
+
+    def __init__(self, failing_question: str):
+        self.failing_question = failing_question
+
+    async def process_with_llm(self, matches, question, organization):
+        if question == self.failing_question:
+            raise RuntimeError("completion failed")
+        return {'answer': 'ok'}
+
+    def build_row(self, question, organization, processed_result):
+        return {'Question': question, 'Organization': organization, 'Answer': processed_result['answer']}
+
+    def is_valid_answer(self, processed_result):
+        return True
+
+    def error_row(self, question, organization, error):
+        return {'Question': question, 'Organization': organization, 'Answer': f"Error: {error}"}
+
+    async def remember_answer(self, question, organization, row):
+        pass
+
+
+def test_failure_after_partial_forward_emits_one_row_per_cell():
+    async def run():
+        pipeline = MatrixPipeline(scraper=None, rag=FakeRAG('bad'), batch_sizes={'llm': 2})
+        pipeline.queues = {'llm': asyncio.Queue()}
+        pipeline.rows = asyncio.Queue()
+        good, bad = PairState('good', 'Org'), PairState('bad', 'Org')
+        # Both jobs land in one batch: the first row is sent before the second job raises
+        pipeline.queues['llm'].put_nowait(Job(good, payload=[]))
+        pipeline.queues['llm'].put_nowait(Job(bad, payload=[]))
+
+        worker = asyncio.create_task(pipeline._worker('llm'))
+        while pipeline.queues['llm'].qsize() or pipeline.rows.qsize() < 2:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+        rows = []
+        while not pipeline.rows.empty():
+            rows.append(pipeline.rows.get_nowait())
+        return rows
+
+    rows = asyncio.run(run())
+    assert sorted((row['Question'], row['Answer']) for row in rows) == [
+        ('bad', 'Error: completion failed'),
+        ('good', 'ok'),
+    ]
+
+
+def test_document_failure_after_done_releases_cell_once():
+    async def run():
+        pipeline = MatrixPipeline(scraper=None, rag=FakeRAG('bad'))
+        pipeline.queues = {'retrieve': asyncio.Queue()}
+        pair = PairState('question', 'Org', pending_pages=2, search_done=True)
+        document = DocumentState('doc', pairs=[pair])
+        job = Job(pair, payload=(document, []))
+
+        job.done = True
+        await pipeline._document_done(document)
+        # A later failure of the same batch must not count the document again
+        await pipeline._fail('embed', job, RuntimeError("upsert failed"))
+        await pipeline._document_done(document)
+        return pair, pipeline.queues['retrieve'].qsize()
+
+    pair, released = asyncio.run(run())
+    assert pair.pending_pages == 1
+    assert not pair.released and released == 0
@@ -0,0 +1,141 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from cache import ResponseCache
+from context_builder import ContextBuilder
+from llm_scheduler import CompletionScheduler
+from pipeline import Job, MatrixPipeline, PairState
+from rag_processor import EnhancedRAGProcessor
+
+COMPLETE_ANSWER = {
+    'answer': 'Revenue grew 5%.',
+    'key_findings': ['Revenue grew 5%'],
+    'metrics': {'revenue_growth': '5%'},
+    'confidence_score': 0.9,
+    'reliability_assessment': {'source_quality': 0.8, 'data_recency': '2024', 'data_completeness': 0.7},
+    'sources': ['https://example.com/report']
+}
+
+
+class FakeCompletions:
+    """Chat completions returning canned message contents in turn"""
+
+    def __init__(self, contents):
+        self.contents = list(contents)
+        self.calls = 0
+
+    async def create(self, model, messages, **kwargs):
+        content = self.contents[min(self.calls, len(self.contents) - 1)]
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+
+@pytest.fixture
+def make_processor(tmp_path):
+    def make(*contents):
+        rag = EnhancedRAGProcessor.__new__(EnhancedRAGProcessor)
+        rag.completions = FakeCompletions(contents)
+        rag.async_openai_client = SimpleNamespace(chat=SimpleNamespace(completions=rag.completions))
+        rag.llm_scheduler = CompletionScheduler()
+        rag.ANALYSIS_PROMPT_TEMPLATE = '{question}\n{organization}\n{sources}'
+        rag.analysis_model = 'gpt-4'
+        rag.analysis_system_prompt = 'Answer in JSON.'
+        rag.analysis_temperature = 0.0
+        rag.prompt_version = 'test'
+        rag.context_builder = ContextBuilder()
+        rag.response_cache = ResponseCache(cache_dir=tmp_path)
+        return rag
+    return make
+
+
+def matches(content='Apple revenue grew 5% in Q1 2024.'):
+    return [SimpleNamespace(metadata={'content': content, 'url': 'https://example.com/report'})]
+
+
+def test_complete_answer_is_cached(make_processor):
+    rag = make_processor(json.dumps(COMPLETE_ANSWER))
+
+    async def run():
+        for _ in range(2):
+            assert await rag.process_with_llm(matches(), 'What was revenue growth?', 'Apple') == COMPLETE_ANSWER
+
+    asyncio.run(run())
+    assert rag.completions.calls == 1
+
+
+@pytest.mark.parametrize(
+    'content',
+    ['{}', json.dumps({k: v for k, v in COMPLETE_ANSWER.items() if k != 'metrics'})],
+    ids=['empty', 'missing-metrics']
+)
+def test_incomplete_answer_is_not_cached(make_processor, content):
+    rag = make_processor(content, json.dumps(COMPLETE_ANSWER))
+
+    async def run():
+        first = await rag.process_with_llm(matches(), 'What was revenue growth?', 'Apple')
+        second = await rag.process_with_llm(matches(), 'What was revenue growth?', 'Apple')
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert not EnhancedRAGProcessor.is_complete_analysis(first)
+    assert second == COMPLETE_ANSWER
+    assert rag.completions.calls == 2
+
+
+def remembered_answers(rag):
+    """Record what the processor would store in the answer cache"""
+    remembered = []
+
+    async def remember_answer(question, organization, row):
+        remembered.append((question, organization, row))
+
+    rag.remember_answer = remember_answer
+    return remembered
+
+
+def test_unparseable_answer_is_not_remembered(make_processor):
+    rag = make_processor('Revenue grew 5%, see the report.')
+    remembered = remembered_answers(rag)
+
+    async def cached_answers(pairs):
+        return [None] * len(pairs)
+
+    async def vectorize_content(search_results):
+        return []
+
+    async def upsert_vectors(vectors):
+        pass
+
+    async def query_matrix(pairs, top_k=5):
+        return [matches() for _ in pairs]
+
+    rag.cached_answers = cached_answers
+    rag.vectorize_content = vectorize_content
+    rag.upsert_vectors = upsert_vectors
+    rag.query_matrix = query_matrix
+
+    frame = asyncio.run(rag.process_data_matrix(['What was revenue growth?'], ['Apple'], []))
+    assert list(frame['Answer']) == [EnhancedRAGProcessor.INVALID_RESPONSE_ANSWER]
+    assert remembered == []
+
+
+@pytest.mark.parametrize('content, expected', [
+    ('not json', 0),
+    (json.dumps(COMPLETE_ANSWER), 1),
+], ids=['unparseable', 'complete'])
+def test_pipeline_remembers_only_valid_answers(make_processor, content, expected):
+    rag = make_processor(content)
+    remembered = remembered_answers(rag)
+
+    async def run():
+        pipeline = MatrixPipeline(scraper=None, rag=rag)
+        pipeline.rows = asyncio.Queue()
+        await pipeline._llm([Job(PairState('What was revenue growth?', 'Apple'), payload=matches())])
+        return pipeline.rows.get_nowait()
+
+    row = asyncio.run(run())
+    assert row['Organization'] == 'Apple'
+    assert len(remembered) == expected
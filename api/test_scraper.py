@@ -0,0 +1,40 @@
+import asyncio
+
+import aiohttp
+
+from scraper import WebScraper
+
+BODY = b'<html><body><p>Quarterly revenue grew 5%.</p></body></html>'
+
+
+async def _read(content_type_header: bytes):
+    """Read one raw HTTP response through WebScraper._read_body"""
+    async def respond(reader, writer):
+        await reader.readuntil(b'\r\n\r\n')
+        writer.write(
+            b'HTTP/1.1 200 OK\r\n' + content_type_header +
+            b'Content-Length: %d\r\nConnection: close\r\n\r\n' % len(BODY) + BODY
+        )
+        await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(respond, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{port}/') as response:
+                return await WebScraper()._read_body(response, 'http://example.com/')
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+def test_response_without_content_type_is_kept(tmp_path, monkeypatch):
+    monkeypatch.setenv('PRAGMA_CACHE_DIR', str(tmp_path))
+    assert asyncio.run(_read(b'')) == BODY.decode()
+
+
+def test_disallowed_content_type_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setenv('PRAGMA_CACHE_DIR', str(tmp_path))
+    assert asyncio.run(_read(b'Content-Type: application/pdf\r\n')) is None
+    assert asyncio.run(_read(b'Content-Type: text/html; charset=utf-8\r\n')) == BODY.decode()
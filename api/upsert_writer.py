@@ -0,0 +1,107 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from rate_limiter import AdaptiveLimiter
+
+
+@dataclass
+class UpsertReport:
+    vectors: int = 0
+    batches: int = 0
+    payload_bytes: int = 0
+    seconds: float = 0.0
+    failed_ids: List[str] = field(default_factory=list)
+
+    @property
+    def vectors_per_second(self) -> float:
+        return self.vectors / self.seconds if self.seconds else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.payload_bytes / 1_000_000 / self.seconds if self.seconds else 0.0
+
+
+class UpsertWriter:
+    """Writes vectors to an index in size-bounded batches sent concurrently.
+
+    Vectors are packed in order into batches of at most `max_batch_vectors`
+    vectors and `max_batch_bytes` of estimated request payload. Batches are
+    sent concurrently and one failing batch neither blocks nor fails the
+    others. For a remote index, pass the provider's adaptive `limiter`: it
+    sets how many batches are in flight and retries each one on its own.
+    Without a limiter, at most `max_concurrency` batches are in flight.
+    """
+
+    def __init__(
+        self,
+        index,
+        max_batch_vectors: int = 100,
+        max_batch_bytes: int = 1_500_000,
+        max_concurrency: int = 4,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.index = index
+        self.max_batch_vectors = max_batch_vectors
+        self.max_batch_bytes = max_batch_bytes
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter
+        self._semaphore = None
+
+    @staticmethod
+    def _payload_size(vector: Dict) -> int:
+        return len(json.dumps(vector, separators=(',', ':'), default=str))
+
+    def _batches(self, vectors: List[Dict]) -> List[Tuple[List[Dict], int]]:
+        """Pack vectors into (batch, payload bytes) within the count and size limits"""
+        batches, current, current_bytes = [], [], 0
+        for vector in vectors:
+            size = self._payload_size(vector)
+            if current and (len(current) >= self.max_batch_vectors or current_bytes + size > self.max_batch_bytes):
+                batches.append((current, current_bytes))
+                current, current_bytes = [], 0
+            current.append(vector)
+            current_bytes += size
+        if current:
+            batches.append((current, current_bytes))
+        return batches
+
+    async def _upsert_batch(self, batch: List[Dict]):
+        if self.limiter is None:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            async with self._semaphore:
+                await asyncio.to_thread(self.index.upsert, vectors=batch)
+        else:
+            await self.limiter.call(lambda: asyncio.to_thread(self.index.upsert, vectors=batch))
+
+    async def write(self, vectors: List[Dict]) -> UpsertReport:
+        """Upsert `vectors` and report throughput and the IDs that could not be written"""
+        report = UpsertReport()
+        if not vectors:
+            return report
+
+        start_time = time.monotonic()
+        batches = self._batches(vectors)
+        outcomes = await asyncio.gather(*(self._upsert_batch(batch) for batch, _ in batches), return_exceptions=True)
+
+        for (batch, batch_bytes), outcome in zip(batches, outcomes):
+            if isinstance(outcome, BaseException):
+                self.logger.error(f"Upsert of {len(batch)} vectors failed: {str(outcome)}")
+                report.failed_ids.extend(vector['id'] for vector in batch)
+                continue
+            report.vectors += len(batch)
+            report.batches += 1
+            report.payload_bytes += batch_bytes
+        report.seconds = time.monotonic() - start_time
+
+        self.logger.info(
+            f"Upserted {report.vectors} vectors in {report.batches} batches over {report.seconds:.2f}s "
+            f"({report.vectors_per_second:.0f} vectors/s, {report.megabytes_per_second:.2f} MB/s), "
+            f"{len(report.failed_ids)} failed"
+        )
+        return report
@@ -0,0 +1,586 @@
+import json
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from config import Config
+
+
+@dataclass
+class VectorMatch:
+    """A query match, shaped like the Pinecone client's ScoredVector"""
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class QueryResponse:
+    matches: List[VectorMatch] = field(default_factory=list)
+
+
+class VectorBackend(ABC):
+    """The subset of the Pinecone Index API the RAG processor relies on.
+
+    A Pinecone Index satisfies it as is; other backends implement it so the
+    processor can swap stores without code changes.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors: List[Dict]):
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict] = None):
+        ...
+
+    @abstractmethod
+    def query(
+        self,
+        vector: List[float],
+        filter: Optional[Dict] = None,
+        top_k: int = 10,
+        include_metadata: bool = False
+    ) -> QueryResponse:
+        ...
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one vector's metadata"""
+    if not filter:
+        return True
+    for key, condition in filter.items():
+        if key == '$and':
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == '$or':
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for op, expected in condition.items():
+            if op == '$eq' and value != expected:
+                return False
+            if op == '$ne' and value == expected:
+                return False
+            if op == '$in' and value not in expected:
+                return False
+            if op == '$nin' and value in expected:
+                return False
+            if op in ('$gt', '$gte', '$lt', '$lte'):
+                if value is None:
+                    return False
+                if op == '$gt' and not value > expected:
+                    return False
+                if op == '$gte' and not value >= expected:
+                    return False
+                if op == '$lt' and not value < expected:
+                    return False
+                if op == '$lte' and not value <= expected:
+                    return False
+    return True
+
+
+class IVFIndex:
+    """Approximate search by probing the nearest k-means clusters.
+
+    Rows are assigned to `n_lists` centroids learned from the stored vectors;
+    a query scores only the rows in its `n_probe` closest clusters.
+    """
+
+    def __init__(self, n_lists: int, n_probe: int = 8, iterations: int = 10, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[np.ndarray] = []
+        self.size = 0
+
+    def build(self, matrix: np.ndarray, rows: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        data = matrix[rows]
+        n_lists = min(self.n_lists, len(rows))
+        centroids = data[rng.choice(len(rows), n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = data[assignment == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [rows[assignment == c] for c in range(n_lists)]
+        self.size = len(rows)
+
+    def candidates(self, query: np.ndarray) -> np.ndarray:
+        nearest = np.argsort(-(self.centroids @ query))[:self.n_probe]
+        return np.concatenate([self.lists[c] for c in nearest])
+
+
+# Set bits per byte value, for Hamming distances on numpy versions without bitwise_count
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class QuantizedCodes:
+    """Compact copy of the index matrix for a coarse first search pass.
+
+    'int8' keeps one signed byte per dimension plus a float scale per row, a
+    quarter of float32; 'binary' keeps one sign bit per dimension, a 32nd.
+    With `dimensions` set, codes cover only the leading dimensions, which suits
+    embedding models trained to be truncated. Codes are memory-mapped next to
+    the matrix and rewritten whenever their rows are.
+
+    Codes are kept in addition to the float32 matrix, which the exact re-rank
+    still reads, so they make the index larger on disk, not smaller. What
+    shrinks is the data a query scans: the codes instead of the whole matrix.
+    """
+
+    KINDS = ('int8', 'binary')
+
+    def __init__(self, path: Path, kind: str, dimension: int, dimensions: Optional[int] = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown quantization {kind!r}, expected one of {self.KINDS}")
+        self.kind = kind
+        self.dimensions = min(dimensions or dimension, dimension)
+        self.width = self.dimensions if kind == 'int8' else (self.dimensions + 7) // 8
+        self.codes_path = path / f"codes-{kind}-{self.dimensions}.bin"
+        self.scales_path = path / f"scales-{kind}-{self.dimensions}.f32"
+        self.codes: Optional[np.memmap] = None
+        self.scales: Optional[np.memmap] = None
+
+    @property
+    def exists(self) -> bool:
+        return self.codes_path.exists()
+
+    def map(self, capacity: int):
+        for attr, file_path, dtype, shape in (
+            ('codes', self.codes_path, np.int8 if self.kind == 'int8' else np.uint8, (capacity, self.width)),
+            ('scales', self.scales_path, np.float32, (capacity,)),
+        ):
+            current = getattr(self, attr)
+            if current is not None:
+                current.flush()
+            size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            with open(file_path, 'ab') as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            setattr(self, attr, np.memmap(file_path, dtype=dtype, mode='r+', shape=shape))
+
+    def _truncate(self, vectors: np.ndarray) -> np.ndarray:
+        head = vectors[..., :self.dimensions]
+        norms = np.linalg.norm(head, axis=-1, keepdims=True)
+        return head / np.where(norms == 0, 1.0, norms)
+
+    def encode(self, rows: np.ndarray, vectors: np.ndarray):
+        head = self._truncate(vectors)
+        if self.kind == 'int8':
+            scales = np.abs(head).max(axis=1)
+            scales[scales == 0] = 1.0
+            self.codes[rows] = np.round(head / scales[:, None] * 127).astype(np.int8)
+            self.scales[rows] = scales
+        else:
+            self.codes[rows] = np.packbits(head > 0, axis=1)
+
+    def scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of `query` to each row"""
+        head = self._truncate(query)
+        if self.kind == 'int8':
+            # Widen to float32 in cache-sized blocks; numpy has no fast int8 matrix product
+            dots = np.concatenate([
+                self.codes[rows[start:start + 1024]].astype(np.float32) @ head
+                for start in range(0, len(rows), 1024)
+            ])
+            return dots * (self.scales[rows] / 127)
+        differing = self.codes[rows] ^ np.packbits(head > 0)
+        if hasattr(np, 'bitwise_count'):
+            hamming = np.bitwise_count(differing).sum(axis=1, dtype=np.int32)
+        else:
+            hamming = _POPCOUNT[differing].sum(axis=1, dtype=np.int32)
+        return 1.0 - 2.0 * hamming / self.dimensions
+
+    def flush(self):
+        self.codes.flush()
+        self.scales.flush()
+
+    def nbytes(self, rows: int) -> int:
+        """Bytes needed for the codes of `rows` vectors"""
+        return rows * (self.width + (4 if self.kind == 'int8' else 0))
+
+
+class LocalVectorIndex(VectorBackend):
+    """In-process vector index on a memory-mapped float32 matrix.
+
+    Vectors are L2-normalized on insert so cosine similarity is a dot product.
+    Queries pre-filter rows by organization through an in-memory postings map,
+    score the candidates exactly with one matrix-vector product and apply any
+    other metadata conditions in score order. With `approximate=True`,
+    candidate sets larger than `ann_threshold` are narrowed by an IVF index
+    first.
+
+    With `quantization` set to 'int8' or 'binary', candidates are first scored
+    on compact codes (optionally over the leading `coarse_dimensions`) and
+    only the best `rerank_factor * top_k` are re-ranked on the exact float
+    vectors, so a query touches little of the float matrix. The memory-mapped
+    matrix is still stored in full; quantization adds the codes on top of it
+    and trades extra disk for a smaller working set, letting the OS keep the
+    codes in RAM while most float rows stay on disk.
+
+    The matrix lives in `vectors.f32` under `path`; ids and metadata are kept
+    in an append-only `meta.jsonl` log that is compacted on load, so writes
+    stay cheap and a restart maps the matrix instead of re-reading vectors.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[str, Path]] = None,
+        dimension: int = 1536,
+        approximate: bool = False,
+        ann_threshold: int = 50_000,
+        n_probe: int = 8,
+        quantization: Optional[str] = None,
+        coarse_dimensions: Optional[int] = None,
+        rerank_factor: int = 10
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path) if path else Config.get_cache_dir() / 'vectors' / 'default'
+        self.dimension = dimension
+        self.approximate = approximate
+        self.ann_threshold = ann_threshold
+        self.n_probe = n_probe
+        self.quantization = quantization
+        self.coarse_dimensions = coarse_dimensions
+        self.rerank_factor = rerank_factor
+        self._lock = threading.RLock()
+
+        self.ids: List[Optional[str]] = []  # row -> id, None for a deleted row
+        self.metadata: List[Optional[Dict[str, Any]]] = []
+        self.rows: Dict[str, int] = {}
+        self.free_rows: List[int] = []
+        self.by_organization: Dict[str, set] = {}
+        self._organization_rows: Dict[str, np.ndarray] = {}
+        self._live_rows: Optional[np.ndarray] = None
+        self.matrix: Optional[np.memmap] = None
+        self.ivf: Optional[IVFIndex] = None
+        self._ivf_pending: set = set()  # rows written since the IVF index was built
+        self.codes: Optional[QuantizedCodes] = None
+        self._load()
+
+    @property
+    def _matrix_path(self) -> Path:
+        return self.path / 'vectors.f32'
+
+    @property
+    def _log_path(self) -> Path:
+        return self.path / 'meta.jsonl'
+
+    def _load(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        entries = 0
+        if self._log_path.exists():
+            with open(self._log_path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # a torn final line from an interrupted write
+                    entries += 1
+                    if 'dimension' in record:
+                        self.dimension = record['dimension']
+                        continue
+                    row = record['row']
+                    while len(self.ids) <= row:
+                        self.ids.append(None)
+                        self.metadata.append(None)
+                    self.ids[row] = record.get('id')
+                    self.metadata[row] = record.get('metadata')
+            for row, vid in enumerate(self.ids):
+                if vid is None:
+                    self.free_rows.append(row)
+                else:
+                    self.rows[vid] = row
+                    self._index_row(row)
+        capacity = max(len(self.ids), 1024)
+        if self._matrix_path.exists():
+            capacity = max(capacity, self._matrix_path.stat().st_size // (4 * self.dimension))
+        self._load_codes(capacity)
+        self._map(capacity)
+        if entries == 0 or entries > 2 * len(self.ids) + 1:
+            self._compact()
+        self.logger.info(f"Loaded local vector index with {len(self.rows)} vectors from {self.path}")
+
+    def _load_codes(self, capacity: int):
+        """Open the quantized codes, rebuilding them when missing; drop codes of other configurations"""
+        if self.quantization:
+            self.codes = QuantizedCodes(self.path, self.quantization, self.dimension, self.coarse_dimensions)
+        # Codes not maintained by this instance would go stale as rows change
+        for stale in list(self.path.glob('codes-*')) + list(self.path.glob('scales-*')):
+            if self.codes is None or stale not in (self.codes.codes_path, self.codes.scales_path):
+                stale.unlink()
+        if self.codes is None:
+            return
+        rebuild = not self.codes.exists
+        self.codes.map(capacity)
+        if rebuild and self.rows:
+            self._map(capacity)
+            rows = self._candidate_rows(None)[0]
+            for start in range(0, len(rows), 10_000):
+                batch = rows[start:start + 10_000]
+                self.codes.encode(batch, np.asarray(self.matrix[batch]))
+            self.codes.flush()
+            self.logger.info(f"Built {self.quantization} codes for {len(rows)} vectors")
+
+    def _compact(self):
+        """Rewrite the log with one entry per row"""
+        tmp_path = self._log_path.with_name(f"meta.jsonl.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({'dimension': self.dimension}) + '\n')
+            for row, vid in enumerate(self.ids):
+                f.write(json.dumps({'row': row, 'id': vid, 'metadata': self.metadata[row]}) + '\n')
+        os.replace(tmp_path, self._log_path)
+
+    def _append(self, rows: List[int]):
+        """Persist the current state of `rows`: vectors first, then their log entries"""
+        self.matrix.flush()
+        if self.codes is not None:
+            self.codes.flush()
+        with open(self._log_path, 'a') as f:
+            for row in rows:
+                f.write(json.dumps({'row': row, 'id': self.ids[row], 'metadata': self.metadata[row]}) + '\n')
+
+    def _map(self, capacity: int):
+        """(Re)map the matrix file, growing it to `capacity` rows"""
+        if self.matrix is not None:
+            self.matrix.flush()
+            self.matrix = None
+        size = capacity * self.dimension * 4
+        with open(self._matrix_path, 'ab') as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self.matrix = np.memmap(self._matrix_path, dtype=np.float32, mode='r+', shape=(capacity, self.dimension))
+        if self.codes is not None and self.codes.codes is not None and self.codes.codes.shape[0] < capacity:
+            self.codes.map(capacity)
+
+    def _index_row(self, row: int):
+        self._live_rows = None
+        organization = self.metadata[row].get('organization')
+        if organization is not None:
+            self.by_organization.setdefault(organization, set()).add(row)
+            self._organization_rows.pop(organization, None)
+
+    def _unindex_row(self, row: int):
+        self._live_rows = None
+        organization = self.metadata[row].get('organization')
+        if organization in self.by_organization:
+            self.by_organization[organization].discard(row)
+            self._organization_rows.pop(organization, None)
+
+    def upsert(self, vectors: List[Dict]):
+        with self._lock:
+            written = []
+            for vector in vectors:
+                values = np.asarray(vector['values'], dtype=np.float32)
+                if values.shape != (self.dimension,):
+                    raise ValueError(f"Vector {vector['id']} has dimension {values.size}, index expects {self.dimension}")
+                row = self.rows.get(vector['id'])
+                if row is not None:
+                    self._unindex_row(row)
+                elif self.free_rows:
+                    row = self.free_rows.pop()
+                else:
+                    row = len(self.ids)
+                    self.ids.append(None)
+                    self.metadata.append(None)
+                    if row >= self.matrix.shape[0]:
+                        self._map(self.matrix.shape[0] * 2)
+                self.matrix[row] = values / (np.linalg.norm(values) or 1.0)
+                self.ids[row] = vector['id']
+                self.metadata[row] = dict(vector.get('metadata') or {})
+                self.rows[vector['id']] = row
+                self._index_row(row)
+                written.append(row)
+                if self.ivf is not None:
+                    self._ivf_pending.add(row)
+            if self.codes is not None and written:
+                written_rows = np.array(written, dtype=np.int64)
+                self.codes.encode(written_rows, np.asarray(self.matrix[written_rows]))
+            self._append(written)
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[Dict] = None):
+        with self._lock:
+            if filter is not None:
+                ids = [vid for vid, row in self.rows.items() if matches_filter(self.metadata[row], filter)]
+            deleted = []
+            for vid in ids or []:
+                row = self.rows.pop(vid, None)
+                if row is None:
+                    continue
+                self._unindex_row(row)
+                self.ids[row] = None
+                self.metadata[row] = None
+                self.free_rows.append(row)
+                deleted.append(row)
+            self._append(deleted)
+
+    def _candidate_rows(self, filter: Optional[Dict]) -> Tuple[np.ndarray, Dict]:
+        """Rows pre-filtered by organization postings, and the filter conditions still to check"""
+        filter = dict(filter or {})
+        organization = filter.get('organization')
+        if isinstance(organization, dict) and set(organization) == {'$eq'}:
+            organization = organization['$eq']
+        if isinstance(organization, str):
+            del filter['organization']
+            rows = self._organization_rows.get(organization)
+            if rows is None:
+                rows = np.fromiter(sorted(self.by_organization.get(organization, ())), dtype=np.int64)
+                self._organization_rows[organization] = rows
+            return rows, filter
+        if self._live_rows is None:
+            self._live_rows = np.fromiter(sorted(self.rows.values()), dtype=np.int64)
+        return self._live_rows, filter
+
+    def _approximate_rows(self, query: np.ndarray) -> np.ndarray:
+        """Rows in the query's nearest IVF clusters plus rows written since the last build"""
+        live = len(self.rows)
+        if self.ivf is None or len(self._ivf_pending) > 0.1 * self.ivf.size or live < 0.5 * self.ivf.size:
+            self.ivf = IVFIndex(n_lists=max(16, int(np.sqrt(live))), n_probe=self.n_probe)
+            self.ivf.build(self.matrix, self._candidate_rows(None)[0])
+            self._ivf_pending = set()
+        pending = np.fromiter(self._ivf_pending, dtype=np.int64)
+        candidates = np.unique(np.concatenate([self.ivf.candidates(query), pending]))
+        # Lists still hold rows deleted since the build
+        return candidates[[self.ids[row] is not None for row in candidates]]
+
+    def _exact_scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        used = len(self.ids)
+        if len(rows) * 2 > used:
+            # Scoring the mapped rows in place beats copying most of them out first
+            return (self.matrix[:used] @ query)[rows]
+        return self.matrix[rows] @ query
+
+    def _select(self, rows: np.ndarray, scores: np.ndarray, remaining: Dict, k: int) -> np.ndarray:
+        """Positions of the `k` best-scoring rows that pass the remaining filter, best first"""
+        if remaining:
+            # Check the other conditions in score order, stopping at k
+            best = []
+            for i in np.argsort(-scores):
+                if matches_filter(self.metadata[rows[i]], remaining):
+                    best.append(i)
+                    if len(best) == k:
+                        break
+            return np.array(best, dtype=np.int64)
+        k = min(k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        return best[np.argsort(-scores[best])]
+
+    def _response(self, rows: np.ndarray, scores: np.ndarray, best: np.ndarray, include_metadata: bool) -> QueryResponse:
+        return QueryResponse(matches=[
+            VectorMatch(
+                id=self.ids[rows[i]],
+                score=float(scores[i]),
+                metadata=dict(self.metadata[rows[i]]) if include_metadata else {}
+            )
+            for i in best
+        ])
+
+    def _query(self, query: np.ndarray, filter: Optional[Dict], top_k: int, include_metadata: bool) -> QueryResponse:
+        rows, remaining = self._candidate_rows(filter)
+        if self.approximate and len(rows) > self.ann_threshold:
+            candidates = self._approximate_rows(query)
+            rows = candidates if len(rows) == len(self.rows) else np.intersect1d(rows, candidates)
+        if len(rows) == 0:
+            return QueryResponse()
+
+        if self.codes is not None and len(rows) > top_k * self.rerank_factor:
+            # Coarse pass on the codes, then exact scores for the shortlist only
+            shortlist = self._select(rows, self.codes.scores(rows, query), remaining, top_k * self.rerank_factor)
+            rows, remaining = rows[shortlist], {}
+
+        scores = self._exact_scores(rows, query)
+        return self._response(rows, scores, self._select(rows, scores, remaining, top_k), include_metadata)
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def query(
+        self,
+        vector: List[float],
+        filter: Optional[Dict] = None,
+        top_k: int = 10,
+        include_metadata: bool = False
+    ) -> QueryResponse:
+        query = self._normalize(vector)[0]
+        with self._lock:
+            return self._query(query, filter, top_k, include_metadata)
+
+    def query_many(
+        self,
+        vectors: List[List[float]],
+        filters: List[Optional[Dict]],
+        top_k: int = 10,
+        include_metadata: bool = False
+    ) -> List[QueryResponse]:
+        """Answer many queries at once, one response per vector in order.
+
+        Queries sharing a filter are scored with a single matrix multiply over
+        that filter's candidate rows. Queries that go through the IVF or the
+        quantized coarse pass are answered one at a time as in `query`.
+        """
+        queries = self._normalize(vectors)
+        responses: List[Optional[QueryResponse]] = [None] * len(queries)
+        groups: Dict[str, List[int]] = {}
+        for i, filter in enumerate(filters):
+            groups.setdefault(json.dumps(filter, sort_keys=True, default=str), []).append(i)
+
+        with self._lock:
+            for positions in groups.values():
+                filter = filters[positions[0]]
+                rows, remaining = self._candidate_rows(filter)
+                exact = not (self.approximate and len(rows) > self.ann_threshold) and not (
+                    self.codes is not None and len(rows) > top_k * self.rerank_factor
+                )
+                if not exact:
+                    for i in positions:
+                        responses[i] = self._query(queries[i], filter, top_k, include_metadata)
+                    continue
+                if len(rows) == 0:
+                    for i in positions:
+                        responses[i] = QueryResponse()
+                    continue
+
+                # One (rows x queries) score block for the whole group
+                block = self._exact_scores(rows, queries[positions].T)
+                for column, i in enumerate(positions):
+                    scores = block[:, column]
+                    responses[i] = self._response(
+                        rows, scores, self._select(rows, scores, remaining, top_k), include_metadata
+                    )
+        return responses
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+_local_indexes: Dict[str, LocalVectorIndex] = {}
+_local_indexes_lock = threading.Lock()
+
+
+def get_local_index(name: str, **kwargs) -> LocalVectorIndex:
+    """Process-wide local index per name, so every processor shares one set of files"""
+    with _local_indexes_lock:
+        if name not in _local_indexes:
+            _local_indexes[name] = LocalVectorIndex(Config.get_cache_dir() / 'vectors' / name, **kwargs)
+        return _local_indexes[name]
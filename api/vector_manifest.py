@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from config import Config
+from dedup import canonicalize_url
+
+
+def vector_id(*parts: str) -> str:
+    """Stable vector ID derived from its identifying fields.
+
+    Unlike the built-in hash(), which is salted per process, the same fields
+    give the same ID in every worker and across restarts.
+    """
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+
+def document_vector_id(organization: str, url: str, snippet: bool = False) -> str:
+    """ID of an organization's document vector, shared by every question that found it.
+
+    A search snippet gets its own ID, so indexing it never overwrites the
+    chunks of the full page at the same URL.
+    """
+    if snippet:
+        return vector_id(organization, canonicalize_url(url), 'snippet')
+    return vector_id(organization, canonicalize_url(url))
+
+
+def content_hash(payload: Dict) -> str:
+    """Hash of everything that determines a vector's values and metadata"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class VectorManifest:
+    """Local record of what has been upserted to a vector index.
+
+    Maps each document ID to the hash of the content it was built from and the
+    number of chunk vectors written for it, so
+    unchanged documents can skip both embedding and upserting on later runs.
+    Entries are only written after an upsert succeeds. A side table links
+    documents to the questions whose searches found them, which keeps the
+    vectors themselves question-independent.
+    """
+
+    def __init__(self, namespace: str = 'default', cache_dir: Optional[Union[str, Path]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.namespace = namespace
+        self.path = (Path(cache_dir) if cache_dir else Config.get_cache_dir()) / 'vector_manifest.sqlite3'
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._db is None:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS manifest ('
+                    'namespace TEXT, id TEXT, content_hash TEXT, updated_at REAL, '
+                    'PRIMARY KEY (namespace, id))'
+                )
+                # Manifests written before chunking lack the chunk count, NULL
+                # there means a single vector stored under the document ID
+                columns = [row[1] for row in self._db.execute('PRAGMA table_info(manifest)')]
+                if 'chunks' not in columns:
+                    self._db.execute('ALTER TABLE manifest ADD COLUMN chunks INTEGER')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS links ('
+                    'namespace TEXT, id TEXT, question TEXT, organization TEXT, linked_at REAL, '
+                    'PRIMARY KEY (namespace, id, question))'
+                )
+                self._db.commit()
+            except Exception as e:
+                self.logger.warning(f"Vector manifest unavailable: {str(e)}")
+                self._db = None
+        return self._db
+
+    def unchanged(self, entries: List[Tuple[str, str]]) -> List[bool]:
+        """For each (id, content hash), whether that exact content is already stored"""
+        with self._lock:
+            db = self._connection()
+            if db is None or not entries:
+                return [False] * len(entries)
+            stored: Dict[str, str] = {}
+            ids = list(dict.fromkeys(vid for vid, _ in entries))
+            try:
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    rows = db.execute(
+                        f"SELECT id, content_hash FROM manifest WHERE namespace = ? "
+                        f"AND id IN ({','.join('?' * len(chunk))})",
+                        [self.namespace, *chunk]
+                    ).fetchall()
+                    stored.update(rows)
+            except Exception as e:
+                self.logger.warning(f"Vector manifest lookup failed: {str(e)}")
+            return [stored.get(vid) == digest for vid, digest in entries]
+
+    def chunk_counts(self, ids: List[str]) -> Dict[str, Optional[int]]:
+        """Stored chunk count per known document ID, None for unchunked legacy entries"""
+        with self._lock:
+            db = self._connection()
+            if db is None or not ids:
+                return {}
+            counts: Dict[str, Optional[int]] = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = db.execute(
+                    f"SELECT id, chunks FROM manifest WHERE namespace = ? "
+                    f"AND id IN ({','.join('?' * len(chunk))})",
+                    [self.namespace, *chunk]
+                ).fetchall()
+                counts.update(rows)
+            return counts
+
+    def record(self, entries: Iterable[Tuple[str, str, int]]):
+        """Remember (id, content hash, chunk count) for documents that were upserted"""
+        now = time.time()
+        rows = [(self.namespace, vid, digest, now, chunks) for vid, digest, chunks in entries]
+        with self._lock:
+            db = self._connection()
+            if db is None or not rows:
+                return
+            try:
+                db.executemany(
+                    'INSERT OR REPLACE INTO manifest (namespace, id, content_hash, updated_at, chunks) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    rows
+                )
+                db.commit()
+            except Exception as e:
+                self.logger.warning(f"Failed to update vector manifest: {str(e)}")
+
+    def link(self, entries: Iterable[Tuple[str, str, str]]):
+        """Record (id, question, organization) links between documents and questions"""
+        now = time.time()
+        rows = [(self.namespace, vid, question, organization, now) for vid, question, organization in entries]
+        with self._lock:
+            db = self._connection()
+            if db is None or not rows:
+                return
+            try:
+                db.executemany('INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?, ?)', rows)
+                db.commit()
+            except Exception as e:
+                self.logger.warning(f"Failed to record document links: {str(e)}")
+
+    def questions_for(self, vid: str) -> List[str]:
+        """Questions whose searches found the document `vid`"""
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return []
+            rows = db.execute(
+                'SELECT question FROM links WHERE namespace = ? AND id = ? ORDER BY linked_at',
+                (self.namespace, vid)
+            ).fetchall()
+            return [question for (question,) in rows]
+
+    def forget(self, ids: Iterable[str]):
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            rows = [(self.namespace, vid) for vid in ids]
+            db.executemany('DELETE FROM manifest WHERE namespace = ? AND id = ?', rows)
+            db.executemany('DELETE FROM links WHERE namespace = ? AND id = ?', rows)
+            db.commit()
+
+    def clear(self):
+        """Drop every entry, e.g. after the index itself was recreated"""
+        with self._lock:
+            db = self._connection()
+            if db is None:
+                return
+            db.execute('DELETE FROM manifest WHERE namespace = ?', (self.namespace,))
+            db.execute('DELETE FROM links WHERE namespace = ?', (self.namespace,))
+            db.commit()